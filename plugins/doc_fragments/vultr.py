@@ -24,16 +24,92 @@ options:
     type: int
   api_retries:
     description:
-      - Amount of retries in case of the Vultr API retuns an HTTP 503 code.
+      - Amount of retries in case of the Vultr API returns a retryable error, see I(api_retry_status_codes).
       - The ENV variable C(VULTR_API_RETRIES) is used as default, when defined.
       - Fallback value is 5 retries if not specified.
     type: int
   api_retry_max_delay:
     description:
-      - Retry backoff delay in seconds is exponential up to this max. value, in seconds.
+      - Retry backoff delay in seconds is randomized and grows with every attempt up to this max. value, in seconds.
       - The ENV variable C(VULTR_API_RETRY_MAX_DELAY) is used as default, when defined.
+      - A C(Retry-After) header returned by the API is honoured up to this max. value.
       - Fallback value is 12 seconds.
     type: int
+  api_deadline:
+    description:
+      - Max. time in seconds an API call may take, retries and backoff included.
+      - The remaining time bounds the HTTP timeout of every attempt and no retry is started past the deadline.
+      - The ENV variable C(VULTR_API_DEADLINE) is used as default, when defined.
+      - Fallback value is C(0), which only limits a call by I(api_retries).
+    type: int
+  api_time_budget:
+    description:
+      - Max. time in seconds all API calls of a task may take together, this bounds the worst case duration of a task.
+      - The ENV variable C(VULTR_API_TIME_BUDGET) is used as default, when defined.
+      - Fallback value is C(0), which disables the budget.
+    type: int
+  api_retry_status_codes:
+    description:
+      - HTTP status codes returned by the Vultr API which are retried, other errors fail immediately.
+      - Connection errors and timeouts are always retried.
+      - The ENV variable C(VULTR_API_RETRY_STATUS_CODES) is used as default, when defined.
+      - Fallback value is C([429, 500, 502, 503, 504]) if not specified.
+    type: list
+    elements: int
+  api_rate_limit:
+    description:
+      - Max. amount of API requests per second of all tasks using the same I(api_account) on this host.
+      - Requests are paced by a token bucket shared between the forks by a state file in a directory private to the user,
+        in C($XDG_RUNTIME_DIR) if set, else in the temp dir.
+      - The ENV variable C(VULTR_API_RATE_LIMIT) is used as default, when defined.
+      - Fallback value is C(0), which disables the rate limiting.
+    type: float
+  api_circuit_threshold:
+    description:
+      - Amount of consecutive failed API requests of all tasks on this host after which requests to the I(api_endpoint) fail fast.
+      - Connection errors and server errors count as failures, after I(api_circuit_cooldown) a single probe request is let through.
+      - Rate limiting, by status C(429), C(503) or a C(Retry-After) header, does not count as failure.
+      - The state is shared between the forks by a state file in the directory private to the user, see I(api_rate_limit).
+      - The ENV variable C(VULTR_API_CIRCUIT_THRESHOLD) is used as default, when defined.
+      - Fallback value is C(0), which disables the circuit breaker.
+    type: int
+  api_circuit_cooldown:
+    description:
+      - Time in seconds requests fail fast once the circuit breaker opened, see I(api_circuit_threshold).
+      - The ENV variable C(VULTR_API_CIRCUIT_COOLDOWN) is used as default, when defined.
+      - Fallback value is 30 seconds if not specified.
+    type: int
+  api_cache_mode:
+    description:
+      - Use of the persistent cache for catalog lists like plans, OS, regions, applications and firewall groups.
+      - The lists are kept for up to an hour, firewall groups for a minute.
+      - The cache is stored in C(~/.cache/ansible-vultr) or the directory set by the ENV variable C(VULTR_API_CACHE_DIR) or C(cache_dir) in the ini file.
+      - The DNS record and firewall rule lists are kept for a day if the API sends an C(ETag) or C(Last-Modified) header
+        and revalidated by a conditional request, the kept list is used if the API returns C(304 Not Modified).
+        Server lists are never kept, they contain secrets like C(default_password).
+      - C(refresh) ignores cached lists but stores the fetched ones, C(disabled) bypasses the cache.
+      - The ENV variable C(VULTR_API_CACHE_MODE) is used as default, when defined.
+      - Fallback value is C(enabled) if not specified.
+    type: str
+    choices: [ enabled, refresh, disabled ]
+  api_metrics:
+    description:
+      - Whether to return telemetry of the API requests in C(vultr_api.api_metrics).
+      - Includes count and latency of requests by path, retries and the time spent in backoff, rate limiting and waiting for states.
+      - Includes the usage of the caches, the amount of coalesced requests and of responses not modified since cached.
+      - The ENV variable C(VULTR_API_METRICS) is used as default, when defined.
+      - Fallback value is C(false) if not specified.
+    type: bool
+  api_broker:
+    description:
+      - Whether to send the API requests through a broker process shared by all tasks on this host, similar to SSH ControlPersist.
+      - The broker keeps the HTTP connections to the API alive and the catalog lists cached by I(api_cache_mode) in memory between tasks.
+      - It is started by the first task on a Unix socket in the directory private to the user, see I(api_rate_limit),
+        and stops after being idle for 60 seconds. A socket not served by the user is refused.
+      - Requests are sent directly if the broker can not be started or reached.
+      - The ENV variable C(VULTR_API_BROKER) is used as default, when defined.
+      - Fallback value is C(false) if not specified.
+    type: bool
   api_account:
     description:
       - Name of the ini section in the C(vultr.ini) file.
@@ -15,11 +15,16 @@ DOCUMENTATION = r'''
     short_description: Vultr inventory source
     extends_documentation_fragment:
         - constructed
+        - inventory_cache
     description:
         - Get inventory hosts from Vultr public cloud.
+        - With I(cache) enabled the servers are cached by account, API endpoint, instance type, I(filter_by_tag) and I(api_version),
+          C(--flush-cache) refreshes the cache.
         - Uses an YAML configuration file ending with either I(vultr.yml) or I(vultr.yaml) to set parameter values (also see examples).
         - Uses I(api_config), I(~/.vultr.ini), I(./vultr.ini) or C(VULTR_API_CONFIG) pointing to a Vultr credentials INI file
           (see U(https://docs.ansible.com/ansible/latest/scenario_guides/guide_vultr.html)).
+        - Set C(VULTR_API_TRACE) to a file path to append spans of the API requests and the population of the inventory
+          as JSON lines of Chrome trace events.
     options:
         plugin:
             description: Token that ensures this is a source file for the 'vultr' plugin.
@@ -40,6 +45,45 @@ DOCUMENTATION = r'''
             type: string
             env:
                 - name: VULTR_API_KEY
+        api_accounts:
+            description:
+                - Accounts to get the servers of concurrently, instead of the single I(api_account).
+                - Either the name of a section in the Vultr configuration file or a dict with the keys C(name),
+                  C(api_key) and optionally C(api_endpoint), falling back to the section of the same name.
+                - Every host gets the variable C(vultr_account) set to the name of its account
+                  and is added to the group C(vultr_account_<name>).
+                - Hosts of different accounts with the same name are merged, use I(hostname) to tell them apart.
+            type: list
+            elements: raw
+        api_endpoint:
+            description:
+                - URL to API endpoint (without trailing slash).
+                - If not specified will be taken from regular Vultr configuration, else C(https://api.vultr.com) is used.
+            type: string
+            env:
+                - name: VULTR_API_ENDPOINT
+        api_timeout:
+            description:
+                - HTTP timeout to Vultr API.
+                - If not specified will be taken from regular Vultr configuration, else 60 seconds are used.
+            type: int
+            env:
+                - name: VULTR_API_TIMEOUT
+        api_retries:
+            description:
+                - Amount of retries in case of the Vultr API returns a connection error, rate limiting or a server error.
+                - If not specified will be taken from regular Vultr configuration, else 5 retries are used.
+            type: int
+            env:
+                - name: VULTR_API_RETRIES
+        api_retry_max_delay:
+            description:
+                - Retry backoff delay in seconds is randomized and grows with every attempt up to this max. value, in seconds.
+                - A C(Retry-After) header returned by the API is honoured up to this max. value.
+                - If not specified will be taken from regular Vultr configuration, else 12 seconds are used.
+            type: int
+            env:
+                - name: VULTR_API_RETRY_MAX_DELAY
         hostname:
             description: Field to match the hostname. Note v4_main_ip corresponds to the main_ip field returned from the API and name to label.
             type: string
@@ -51,6 +95,25 @@ DOCUMENTATION = r'''
         filter_by_tag:
             description: Only return servers filtered by this tag
             type: string
+        instance_types:
+            description:
+                - Types of instances to get, fetched concurrently and normalized by a schema per type.
+                - With other types than C(cloud), every host gets the variable C(vultr_instance_type)
+                  and is added to the group C(vultr_<type>), e.g. C(vultr_baremetal).
+                - Bare metal hosts have C(cpu_count) instead of C(vcpu_count) and no power or backup related variables.
+            type: list
+            elements: string
+            default: [ cloud ]
+            choices: [ cloud, baremetal ]
+        api_version:
+            description:
+                - Version of the Vultr API the servers are queried from.
+                - With C(v2) the servers are paged through by cursor and each page is processed while the next one is fetched.
+                - Host variables keep their names across versions, but variables the v2 API does not return are missing with C(v2).
+                - The list of tags the v2 API returns is set as C(vultr_tags), C(tags) is reserved by Ansible.
+            type: string
+            default: v1
+            choices: [ v1, v2 ]
 '''
 
 EXAMPLES = r'''
@@ -68,17 +131,60 @@ keyed_groups:
 # Pass a tag filter to the API
 plugin: vultr
 filter_by_tag: Cache
+
+# Page through the servers of the v2 API
+plugin: vultr
+api_version: v2
+
+# Get the servers of several accounts at once
+plugin: vultr
+hostname: v4_main_ip
+api_accounts:
+  - production
+  - staging
+  - name: lab
+    api_key: ABCDEFGHIJKLMNOPQRSTUVWXYZ
+keyed_groups:
+  - prefix: account
+    key: vultr_account
+
+# Get the cloud and bare metal servers
+plugin: vultr
+instance_types:
+  - cloud
+  - baremetal
+
+# Cache the servers for an hour
+plugin: vultr
+cache: true
+cache_plugin: jsonfile
+cache_connection: ~/.cache/ansible-vultr-inventory
+cache_timeout: 3600
 '''
 
+import hashlib
+import itertools
 import json
+import threading
 
 from ansible.errors import AnsibleError
-from ansible.plugins.inventory import BaseInventoryPlugin, Constructable
+from ansible.plugins.inventory import BaseInventoryPlugin, Constructable, Cacheable
 from ansible.module_utils.six.moves import configparser
-from ansible.module_utils.urls import open_url
-from ansible.module_utils._text import to_native
-from ..module_utils.vultr import Vultr, VULTR_API_ENDPOINT, VULTR_USER_AGENT
-from ansible.module_utils.six.moves.urllib.parse import quote
+from ansible.module_utils._text import to_bytes, to_native
+from ..module_utils.vultr import (
+    Vultr,
+    VultrAPIClient,
+    VultrAPIError,
+    VultrConnectionPool,
+    VultrJSONStream,
+    VultrSchema,
+    VultrTracer,
+    VultrV2Pager,
+    VULTR_NULL_SPAN,
+    VULTR_API_ENDPOINT,
+    VULTR_API_V2_PER_PAGE,
+)
+from ansible.module_utils.six.moves.urllib.parse import quote, urlencode
 
 
 SCHEMA = {
@@ -113,41 +219,154 @@ SCHEMA = {
     'vcpu_count': dict(convert_to='int'),
 }
 
+SCHEMA_V2 = {
+    'id': dict(),
+    'label': dict(key='name'),
+    'date_created': dict(),
+    'allowed_bandwidth': dict(key='allowed_bandwidth_gb', convert_to='float'),
+    'features': dict(key='auto_backup_enabled', transform=lambda features: 'auto_backups' in (features or [])),
+    'kvm': dict(key='kvm_url'),
+    'internal_ip': dict(),
+    'disk': dict(),
+    'region': dict(),
+    'main_ip': dict(key='v4_main_ip'),
+    'netmask_v4': dict(key='v4_netmask'),
+    'gateway_v4': dict(key='v4_gateway'),
+    'os': dict(),
+    'power_status': dict(),
+    'ram': dict(),
+    'plan': dict(),
+    'server_status': dict(key='server_state'),
+    'status': dict(),
+    'firewall_group_id': dict(key='firewall_group'),
+    'tag': dict(),
+    # tags is reserved by Ansible
+    'tags': dict(key='vultr_tags'),
+    'hostname': dict(),
+    'v6_main_ip': dict(),
+    'v6_network': dict(),
+    'v6_network_size': dict(),
+    'vcpu_count': dict(convert_to='int'),
+}
+
+SCHEMA_BAREMETAL = {
+    'SUBID': dict(key='id'),
+    'label': dict(key='name'),
+    'date_created': dict(),
+    'allowed_bandwidth_gb': dict(convert_to='float'),
+    'current_bandwidth_gb': dict(),
+    'default_password': dict(),
+    'disk': dict(),
+    'cost_per_month': dict(convert_to='float'),
+    'location': dict(key='region'),
+    'main_ip': dict(key='v4_main_ip'),
+    'netmask_v4': dict(key='v4_netmask'),
+    'gateway_v4': dict(key='v4_gateway'),
+    'os': dict(),
+    'pending_charges': dict(convert_to='float'),
+    'ram': dict(),
+    'plan': dict(),
+    'status': dict(),
+    'tag': dict(),
+    'v6_main_ip': dict(),
+    'v6_network': dict(),
+    'v6_network_size': dict(),
+    'v6_networks': dict(),
+    'cpu_count': dict(convert_to='int'),
+}
+
+SCHEMA_V2_BAREMETAL = {
+    'id': dict(),
+    'label': dict(key='name'),
+    'date_created': dict(),
+    'default_password': dict(),
+    'disk': dict(),
+    'region': dict(),
+    'main_ip': dict(key='v4_main_ip'),
+    'netmask_v4': dict(key='v4_netmask'),
+    'gateway_v4': dict(key='v4_gateway'),
+    'os': dict(),
+    'ram': dict(),
+    'plan': dict(),
+    'status': dict(),
+    'tag': dict(),
+    # tags is reserved by Ansible
+    'tags': dict(key='vultr_tags'),
+    'v6_main_ip': dict(),
+    'v6_network': dict(),
+    'v6_network_size': dict(),
+    'cpu_count': dict(convert_to='int'),
+}
+
+# API resource and schema of the instance types by API version
+INSTANCE_TYPES = {
+    'v1': {
+        'cloud': ('server', SCHEMA),
+        'baremetal': ('baremetal', SCHEMA_BAREMETAL),
+    },
+    'v2': {
+        'cloud': ('instances', SCHEMA_V2),
+        'baremetal': ('bare-metals', SCHEMA_V2_BAREMETAL),
+    },
+}
 
-def _load_conf(path, account):
 
-    if path:
-        conf = configparser.ConfigParser()
-        conf.read(path)
+def _load_conf(path):
+    """Return the sections of the Vultr configuration file, read once for all accounts."""
+    conf = configparser.ConfigParser()
+    conf.read(path or Vultr.get_ini_config_paths())
+    return dict((section, dict(conf.items(section))) for section in conf.sections())
 
-        if not conf._sections.get(account):
-            return None
 
-        return dict(conf.items(account))
-    else:
-        return Vultr.read_ini_config(account)
+def _trace(tracer, name, cat='api', **args):
+    if tracer is None:
+        return VULTR_NULL_SPAN
+    return tracer.span(name, cat, **args)
 
 
-def _retrieve_servers(api_key, tag_filter=None):
-    api_url = '%s/v1/server/list' % VULTR_API_ENDPOINT
+def _retrieve_servers(client, tag_filter=None, resource='server'):
+    path = '/v1/%s/list' % resource
     if tag_filter is not None:
-        api_url = api_url + '?tag=%s' % quote(tag_filter)
+        path = path + '?tag=%s' % quote(tag_filter)
 
     try:
-        response = open_url(
-            api_url, headers={'API-Key': api_key, 'Content-type': 'application/json'},
-            http_agent=VULTR_USER_AGENT,
-        )
-        servers_list = json.loads(response.read())
+        response, info = client.get(path, stream=True)
+
+        # Decode the servers one by one while the response is read
+        for server in VultrJSONStream(response):
+            yield server
+    except VultrAPIError as e:
+        raise AnsibleError("Error while fetching %s%s: %s" % (client.api_endpoint, path, to_native(e)))
+    except ValueError:
+        raise AnsibleError("Incorrect JSON payload")
+    except Exception as e:
+        raise AnsibleError("Error while fetching %s%s: %s" % (client.api_endpoint, path, to_native(e)))
+
 
-        return servers_list.values() if servers_list else []
+def _retrieve_servers_v2(client, tag_filter=None, resource='instances'):
+    path = '/v2/%s' % resource
+
+    def fetch_page(cursor):
+        query = {'per_page': VULTR_API_V2_PER_PAGE}
+        if tag_filter is not None:
+            query['tag'] = tag_filter
+        if cursor:
+            query['cursor'] = cursor
+        body, info = client.get('%s?%s' % (path, urlencode(query)))
+        return json.loads(to_native(body))
+
+    try:
+        for server in VultrV2Pager(fetch_page, resource.replace('-', '_')):
+            yield server
+    except VultrAPIError as e:
+        raise AnsibleError("Error while fetching %s%s: %s" % (client.api_endpoint, path, to_native(e)))
     except ValueError:
         raise AnsibleError("Incorrect JSON payload")
     except Exception as e:
-        raise AnsibleError("Error while fetching %s: %s" % (api_url, to_native(e)))
+        raise AnsibleError("Error while fetching %s%s: %s" % (client.api_endpoint, path, to_native(e)))
 
 
-class InventoryModule(BaseInventoryPlugin, Constructable):
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
 
     NAME = 'ngine_io.vultr.vultr'
 
@@ -158,43 +377,232 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
                 valid = True
         return valid
 
+    def _get_api_settings(self, account_name, account_conf):
+        """Return the timeout and retry settings of an account, the inventory options take precedence over the ini file."""
+        try:
+            return {
+                'api_timeout': self.get_option('api_timeout') or int(account_conf.get('timeout') or 60),
+                'api_retries': self.get_option('api_retries') or int(account_conf.get('retries') or 5),
+                'api_retry_max_delay': self.get_option('api_retry_max_delay') or int(account_conf.get('retry_max_delay') or 12),
+            }
+        except ValueError as e:
+            raise AnsibleError("One of the following settings, in section '%s' in the ini config file has not a valid value: "
+                               "timeout, retries, retry_max_delay. Error was %s" % (account_name, to_native(e)))
+
+    def _get_accounts(self, conf):
+        """Return the name, API key, endpoint and API settings of every account to get the servers of."""
+        if not self.get_option('api_accounts'):
+            account_conf = conf.get(self.get_option('api_account')) or dict()
+            api_key = self.get_option('api_key') or account_conf.get('key')
+            if not api_key:
+                raise AnsibleError('Could not find an API key. Check inventory file and Vultr configuration files.')
+            account = {
+                'name': self.get_option('api_account'),
+                'api_key': api_key,
+                'api_endpoint': self.get_option('api_endpoint') or account_conf.get('endpoint') or VULTR_API_ENDPOINT,
+            }
+            account.update(self._get_api_settings(account['name'], account_conf))
+            return [account]
+
+        accounts = []
+        for account in self.get_option('api_accounts'):
+            if not isinstance(account, dict):
+                account = {'name': account}
+            if not account.get('name'):
+                raise AnsibleError("Every entry of api_accounts needs a name, got %s" % account)
+            account_conf = conf.get(account['name']) or dict()
+            api_key = account.get('api_key') or account_conf.get('key')
+            if not api_key:
+                raise AnsibleError("Could not find an API key for the account %s. Check inventory file and Vultr configuration files." % account['name'])
+            settings = {
+                'name': account['name'],
+                'api_key': api_key,
+                'api_endpoint': account.get('api_endpoint') or account_conf.get('endpoint') or self.get_option('api_endpoint') or VULTR_API_ENDPOINT,
+            }
+            settings.update(self._get_api_settings(account['name'], account_conf))
+            accounts.append(settings)
+        return accounts
+
+    def _get_servers_cache_key(self, source, filter_by_tag):
+        """Return the cache key of the servers, the API key is hashed to not leak it in the cache."""
+        key = hashlib.sha1(to_bytes("%s %s %s %s %s %s" % (
+            source['account']['name'],
+            source['account']['api_key'],
+            source['account']['api_endpoint'],
+            source['instance_type'],
+            filter_by_tag,
+            self.get_option('api_version'),
+        ))).hexdigest()[:16]
+        return 'vultr_servers_%s' % key
+
+    @staticmethod
+    def _retrieve_sources_servers(sources, fetch_servers):
+        """Yield every source with its servers, fetching the servers of several sources concurrently.
+
+        A source is an instance type of an account. The servers of a source are yielded while the ones of
+        the following sources are still fetched, so the load time is bound by the slowest source.
+        The servers of a single source are streamed.
+        """
+        if len(sources) == 1:
+            yield sources[0], fetch_servers(sources[0])
+            return
+
+        results = [None] * len(sources)
+
+        def run(index, source):
+            try:
+                results[index] = (list(fetch_servers(source)), None)
+            except Exception as e:
+                results[index] = (None, e)
+
+        threads = []
+        for index, source in enumerate(sources):
+            thread = threading.Thread(target=run, args=(index, source))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        for index, thread in enumerate(threads):
+            thread.join()
+            servers, error = results[index]
+            if error is not None:
+                raise error
+            yield sources[index], servers
+
+    def _populate(self, sources_servers, hostname_preference, multiple_accounts=False, multiple_instance_types=False):
+        """Add the servers of every source as hosts to the inventory, return the amount of hosts.
+
+        The constructed options are looked up once and skipped if they are empty.
+        """
+        strict = self.get_option('strict')
+        compose = self.get_option('compose')
+        groups = self.get_option('groups')
+        keyed_groups = self.get_option('keyed_groups')
+
+        hosts = 0
+        for source, servers in sources_servers:
+            account = source['account']
+            if multiple_accounts:
+                account_group = self._sanitize_group_name('vultr_account_%s' % account['name'])
+                self.inventory.add_group(group=account_group)
+
+            if multiple_instance_types:
+                instance_type_group = 'vultr_%s' % source['instance_type']
+                self.inventory.add_group(group=instance_type_group)
+
+            for server in servers:
+                hosts += 1
+                host_name = server['name']
+
+                self.inventory.add_host(host=host_name, group='vultr')
+
+                # The servers may be stored in the inventory cache, which must not get the keys added here
+                if multiple_accounts or multiple_instance_types:
+                    server = dict(server)
+
+                if multiple_accounts:
+                    server['vultr_account'] = account['name']
+                    self.inventory.add_host(host=host_name, group=account_group)
+
+                if multiple_instance_types:
+                    server['vultr_instance_type'] = source['instance_type']
+                    self.inventory.add_host(host=host_name, group=instance_type_group)
+
+                for attribute, value in server.items():
+                    self.inventory.set_variable(host_name, attribute, value)
+
+                if hostname_preference != 'name':
+                    self.inventory.set_variable(host_name, 'ansible_host', server[hostname_preference])
+
+                # Composed variables
+                if compose:
+                    self._set_composite_vars(compose, server, host_name, strict=strict)
+
+                # Complex groups based on jinja2 conditionals, hosts that meet the conditional are added to group
+                if groups:
+                    self._add_host_to_composed_groups(groups, server, host_name, strict=strict)
+
+                # Create groups based on variable values and add the corresponding hosts to it
+                if keyed_groups:
+                    self._add_host_to_keyed_groups(keyed_groups, server, host_name, strict=strict)
+
+        return hosts
+
     def parse(self, inventory, loader, path, cache=True):
         super(InventoryModule, self).parse(inventory, loader, path)
         self._read_config_data(path=path)
 
-        conf = _load_conf(self.get_option('api_config'), self.get_option('api_account'))
-        try:
-            api_key = self.get_option('api_key') or conf.get('key')
-        except Exception:
-            raise AnsibleError('Could not find an API key. Check inventory file and Vultr configuration files.')
+        accounts = self._get_accounts(_load_conf(self.get_option('api_config')))
+        multiple_accounts = bool(self.get_option('api_accounts'))
+        instance_types = self.get_option('instance_types')
+        multiple_instance_types = instance_types != ['cloud']
 
         hostname_preference = self.get_option('hostname')
 
         # Add a top group 'vultr'
         self.inventory.add_group(group='vultr')
 
-        # Filter by tag is supported by the api with a query
-        filter_by_tag = self.get_option('filter_by_tag')
-        for server in _retrieve_servers(api_key, filter_by_tag):
-
-            server = Vultr.normalize_result(server, SCHEMA)
-
-            self.inventory.add_host(host=server['name'], group='vultr')
-
-            for attribute, value in server.items():
-                self.inventory.set_variable(server['name'], attribute, value)
-
-            if hostname_preference != 'name':
-                self.inventory.set_variable(server['name'], 'ansible_host', server[hostname_preference])
-
-            # Use constructed if applicable
-            strict = self.get_option('strict')
+        connection_pool = VultrConnectionPool()
+        if self.get_option('api_version') == 'v2':
+            retrieve_servers = _retrieve_servers_v2
+        else:
+            retrieve_servers = _retrieve_servers
+        sources_by_type = dict(
+            (instance_type, (resource, VultrSchema(schema)))
+            for instance_type, (resource, schema) in INSTANCE_TYPES[self.get_option('api_version')].items()
+        )
 
-            # Composed variables
-            self._set_composite_vars(self.get_option('compose'), server, server['name'], strict=strict)
+        # Spans of the API requests and the population of the inventory, only if enabled
+        try:
+            tracer = VultrTracer.from_env('vultr inventory')
+        except (IOError, OSError) as e:
+            raise AnsibleError("Could not open the trace file: %s" % to_native(e))
+
+        # The clients of all accounts share the connections
+        clients = dict(
+            (account['name'], VultrAPIClient(
+                api_key=account['api_key'],
+                api_endpoint=account['api_endpoint'],
+                timeout=account['api_timeout'],
+                retries=account['api_retries'],
+                retry_max_delay=account['api_retry_max_delay'],
+                connection_pool=connection_pool,
+                tracer=tracer,
+            )) for account in accounts
+        )
 
-            # Complex groups based on jinja2 conditionals, hosts that meet the conditional are added to group
-            self._add_host_to_composed_groups(self.get_option('groups'), server, server['name'], strict=strict)
+        # Filter by tag is supported by the api with a query
+        filter_by_tag = self.get_option('filter_by_tag')
 
-            # Create groups based on variable values and add the corresponding hosts to it
-            self._add_host_to_keyed_groups(self.get_option('keyed_groups'), server, server['name'], strict=strict)
+        # Read the servers from the cache if enabled, unless it is flushed
+        user_cache_setting = self.get_option('cache')
+        cached_sources = []
+        pending_sources = []
+        for account in accounts:
+            for instance_type in instance_types:
+                source = dict(account=account, instance_type=instance_type)
+                if user_cache_setting and cache:
+                    try:
+                        cached_sources.append((source, self._cache[self._get_servers_cache_key(source, filter_by_tag)]))
+                        continue
+                    except KeyError:
+                        pass
+                pending_sources.append(source)
+
+        def fetch_servers(source):
+            resource, schema = sources_by_type[source['instance_type']]
+            servers = (schema.normalize(server) for server in retrieve_servers(clients[source['account']['name']], filter_by_tag, resource))
+            if user_cache_setting:
+                servers = list(servers)
+                self._cache[self._get_servers_cache_key(source, filter_by_tag)] = servers
+            return servers
+
+        sources_servers = cached_sources
+        if pending_sources:
+            sources_servers = itertools.chain(cached_sources, self._retrieve_sources_servers(pending_sources, fetch_servers))
+
+        with _trace(tracer, 'populate', cat='normalize', sources=len(cached_sources) + len(pending_sources), cached=len(cached_sources)) as span:
+            hosts = self._populate(sources_servers, hostname_preference, multiple_accounts, multiple_instance_types)
+            span.set(hosts=hosts)
+
+        self.display.vvv("Vultr API connections: %s" % connection_pool.stats)
@@ -6,16 +6,93 @@ from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
 import os
+import atexit
+import base64
+import codecs
+import email.utils
+import errno
+import hashlib
+import json
+import socket
+import ssl
+import stat
+import struct
+import sys
+import tempfile
+import threading
 import time
+import types
 import random
 import urllib
-from ansible.module_utils.six.moves import configparser
-from ansible.module_utils._text import to_text, to_native
-from ansible.module_utils.urls import fetch_url
+import zlib
+from io import BytesIO
+from ansible.module_utils.six import integer_types, reraise
+from ansible.module_utils.six.moves import configparser, http_client, queue, socketserver
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+from ansible.module_utils.six.moves.urllib.parse import parse_qsl, urlencode, urlparse
+from ansible.module_utils.six.moves.urllib.request import getproxies, proxy_bypass
+from ansible.module_utils._text import to_bytes, to_text, to_native
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.module_utils.urls import fetch_url, open_url
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+try:
+    import cProfile
+    import pstats
+    HAS_CPROFILE = True
+except ImportError:
+    HAS_CPROFILE = False
 
 
 VULTR_API_ENDPOINT = "https://api.vultr.com"
 VULTR_USER_AGENT = 'Ansible Vultr'
+VULTR_API_RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+# Seconds a GET response is shared with identical requests
+VULTR_API_COALESCE_WINDOW = 1
+
+# Max. amount of concurrent requests of api_query_many()
+VULTR_API_MAX_WORKERS = 8
+
+# Seconds the broker process keeps running without requests
+VULTR_API_BROKER_IDLE_TIMEOUT = 60
+
+# Items per page requested from paginated v2 API lists
+VULTR_API_V2_PER_PAGE = 100
+
+# Seconds the validators and body of a GET response are kept for revalidation
+VULTR_API_CONDITIONAL_TTL = 86400
+
+# Large lists revalidated by conditional requests, their bodies are kept as
+# returned and must not contain any of VULTR_API_SECRET_FIELDS
+VULTR_API_CONDITIONAL_PATHS = frozenset([
+    '/v1/dns/records',
+    '/v1/firewall/rule_list',
+])
+
+# Fields of the responses never written to disk
+VULTR_API_SECRET_FIELDS = frozenset([
+    'api_key',
+    'default_password',
+    'kvm_url',
+])
+
+# Value replacing the secrets in recorded cassettes
+VULTR_API_REDACTED = 'REDACTED'
+
+# Seconds the catalog lists are kept in the persistent cache, by resource
+VULTR_API_CACHE_TTLS = {
+    'app': 3600,
+    'firewall': 60,
+    'os': 3600,
+    'plans': 3600,
+    'regions': 3600,
+}
 
 
 def vultr_argument_spec():
@@ -24,12 +101,1434 @@ def vultr_argument_spec():
         api_timeout=dict(type='int', default=os.environ.get('VULTR_API_TIMEOUT')),
         api_retries=dict(type='int', default=os.environ.get('VULTR_API_RETRIES')),
         api_retry_max_delay=dict(type='int', default=os.environ.get('VULTR_API_RETRY_MAX_DELAY')),
+        api_deadline=dict(type='int', default=os.environ.get('VULTR_API_DEADLINE')),
+        api_time_budget=dict(type='int', default=os.environ.get('VULTR_API_TIME_BUDGET')),
+        api_retry_status_codes=dict(type='list', elements='int', default=os.environ.get('VULTR_API_RETRY_STATUS_CODES')),
+        api_rate_limit=dict(type='float', default=os.environ.get('VULTR_API_RATE_LIMIT')),
+        api_circuit_threshold=dict(type='int', default=os.environ.get('VULTR_API_CIRCUIT_THRESHOLD')),
+        api_circuit_cooldown=dict(type='int', default=os.environ.get('VULTR_API_CIRCUIT_COOLDOWN')),
+        api_cache_mode=dict(type='str', choices=['enabled', 'refresh', 'disabled'], default=os.environ.get('VULTR_API_CACHE_MODE')),
+        api_metrics=dict(type='bool', default=os.environ.get('VULTR_API_METRICS')),
+        api_broker=dict(type='bool', default=os.environ.get('VULTR_API_BROKER')),
         api_account=dict(type='str', default=os.environ.get('VULTR_API_ACCOUNT') or 'default'),
         api_endpoint=dict(type='str', default=os.environ.get('VULTR_API_ENDPOINT')),
         validate_certs=dict(type='bool', default=True),
     )
 
 
+def get_state_dir():
+    """Return the directory of the state files shared by all forks, private to the user.
+
+    It is created in $XDG_RUNTIME_DIR if set, else in the temp dir. An existing
+    directory is refused unless it is a directory owned by the user and not
+    accessible by others, as the state files are shared by path.
+    """
+    base_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not base_dir or not os.path.isdir(base_dir):
+        base_dir = tempfile.gettempdir()
+    state_dir = os.path.join(base_dir, 'ansible-vultr-%s' % os.getuid())
+
+    try:
+        os.mkdir(state_dir, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    state = os.lstat(state_dir)
+    if not stat.S_ISDIR(state.st_mode) or state.st_uid != os.getuid() or state.st_mode & 0o077:
+        raise OSError(errno.EPERM, "State dir %s is not a directory private to uid %s" % (state_dir, os.getuid()))
+    return state_dir
+
+
+def get_state_file(name, *keys):
+    """Return the path of a state file in the state dir shared by all forks, see get_state_dir()."""
+    state_id = hashlib.sha1(to_bytes(" ".join("%s" % key for key in keys))).hexdigest()
+    return os.path.join(get_state_dir(), '%s-%s' % (name, state_id))
+
+
+def open_state_file(path):
+    """Open a state file for reading and writing, a symlink in its place is not followed."""
+    return os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+
+
+class VultrAPIError(Exception):
+    pass
+
+
+class VultrConnectionPool:
+    """Keep-alive HTTP(S) connections to the Vultr API.
+
+    Connections are kept open after a request and handed out again for the
+    following requests to the same host, so only the first request of a run
+    pays for the TCP and TLS handshake. Responses are requested compressed
+    and decompressed transparently.
+    """
+
+    def __init__(self, validate_certs=True):
+        self.validate_certs = validate_certs
+        self._idle = dict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'bytes_received': 0,
+            'bytes_decoded': 0,
+        }
+
+    def count(self, **counts):
+        """Add to the stats, the pool may be shared by threads e.g. of the broker."""
+        with self._lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+    @staticmethod
+    def is_proxied(url):
+        parsed = urlparse(url)
+        return bool(getproxies().get(parsed.scheme)) and not proxy_bypass(parsed.hostname or '')
+
+    def _new_connection(self, scheme, netloc, timeout):
+        if scheme == 'https':
+            context = ssl.create_default_context()
+            if not self.validate_certs:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            conn = http_client.HTTPSConnection(netloc, timeout=timeout, context=context)
+        else:
+            conn = http_client.HTTPConnection(netloc, timeout=timeout)
+        self.count(connections_opened=1)
+        return conn
+
+    def _acquire(self, pool_key, timeout):
+        with self._lock:
+            idle = self._idle.get(pool_key)
+            if idle:
+                conn = idle.pop()
+                self.stats['connections_reused'] += 1
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+        return self._new_connection(pool_key[0], pool_key[1], timeout), False
+
+    def _release(self, pool_key, conn):
+        with self._lock:
+            self._idle.setdefault(pool_key, []).append(conn)
+
+    def close(self):
+        with self._lock:
+            for connections in self._idle.values():
+                for conn in connections:
+                    conn.close()
+            self._idle = dict()
+
+    def _finish(self, pool_key, conn, response, complete):
+        if complete and not response.will_close:
+            self._release(pool_key, conn)
+        else:
+            conn.close()
+
+    def request(self, url, method="GET", data=None, headers=None, timeout=60, stream=False):
+        """Send a request and return a tuple of body and info like fetch_url.
+
+        With stream, the body of a successful response is returned as file like
+        object, the connection goes back to the pool once it was read entirely.
+        """
+        parsed = urlparse(url)
+        pool_key = (parsed.scheme, parsed.netloc)
+        selector = parsed.path or '/'
+        if parsed.query:
+            selector += '?' + parsed.query
+
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip, deflate')
+        if data is not None:
+            data = to_bytes(data)
+            headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+
+        self.count(requests=1)
+        while True:
+            conn, reused = self._acquire(pool_key, timeout)
+            try:
+                conn.request(method, selector, body=data, headers=headers)
+                response = conn.getresponse()
+            except socket.timeout as e:
+                conn.close()
+                return None, {'status': -1, 'msg': "Request failed: %s" % to_native(e), 'url': url}
+            except (http_client.HTTPException, socket.error) as e:
+                conn.close()
+                # The server may have dropped an idle keep-alive connection, retry on another one.
+                # Only before a response arrived, the request may have been processed otherwise.
+                if reused:
+                    continue
+                return None, {'status': -1, 'msg': "Request failed: %s" % to_native(e), 'url': url}
+            break
+
+        body = VultrPooledResponse(
+            response,
+            lambda complete: self._finish(pool_key, conn, response, complete),
+            self.count,
+        )
+        if not stream or response.status >= 400:
+            try:
+                body = body.read()
+            except (http_client.HTTPException, socket.error) as e:
+                conn.close()
+                return None, {
+                    'status': -1,
+                    'msg': "Reading the response failed: %s" % to_native(e),
+                    'url': url,
+                    # The request was processed, sending it again is only safe for GET
+                    'retryable': method == "GET",
+                }
+
+        info = dict((k.lower(), v) for k, v in response.getheaders())
+        info.update({
+            'status': response.status,
+            'url': url,
+        })
+
+        if stream and response.status < 400:
+            info['msg'] = "OK"
+            return body, info
+
+        if response.status < 400:
+            info['msg'] = "OK (%s bytes)" % len(body)
+        else:
+            info['msg'] = "HTTP Error %s: %s" % (response.status, response.reason)
+            info['body'] = body
+        return body, info
+
+
+class VultrPooledResponse:
+    """Body of a pooled response, handing its connection back to the pool when read.
+
+    A gzip or deflate encoded body is decompressed on the fly, the stats count
+    the bytes received as well as the bytes after decoding.
+    """
+
+    def __init__(self, response, finish, count):
+        self.response = response
+        self._finish = finish
+        self.count = count
+        self.buffer = b''
+        self.done = False
+
+        self.decompressor = None
+        if (response.getheader('content-encoding') or '').lower() in ('gzip', 'deflate'):
+            # Accept gzip as well as zlib headers
+            self.decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+
+    def read(self, amt=None):
+        received = decoded = 0
+        while not self.done and (amt is None or len(self.buffer) < amt):
+            chunk = self.response.read(amt) if amt else self.response.read()
+            received += len(chunk)
+            self.done = not chunk or self.response.isclosed()
+            if self.decompressor is not None:
+                chunk = self.decompressor.decompress(chunk)
+                if self.done:
+                    chunk += self.decompressor.flush()
+            decoded += len(chunk)
+            self.buffer += chunk
+        if received:
+            self.count(bytes_received=received, bytes_decoded=decoded)
+
+        if self.done:
+            self.close()
+
+        if amt is None:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+        return data
+
+    def close(self):
+        if self._finish is not None:
+            finish, self._finish = self._finish, None
+            finish(self.response.isclosed())
+
+
+class VultrRecordingResponse:
+    """Pass a response body through while writing a copy of it to the persistent cache.
+
+    The copy is committed once the body was read entirely and dropped if the
+    response is closed or fails before.
+    """
+
+    def __init__(self, response, writer):
+        self.response = response
+        self.writer = writer
+
+    def read(self, amt=None):
+        try:
+            chunk = self.response.read(amt) if amt else self.response.read()
+        except Exception:
+            self._abort()
+            raise
+        if self.writer is not None:
+            self.writer.write(chunk)
+            if not chunk or not amt:
+                writer, self.writer = self.writer, None
+                writer.commit()
+        return chunk
+
+    def _abort(self):
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            writer.abort()
+
+    def close(self):
+        self._abort()
+        self.response.close()
+
+
+class VultrJSONStream:
+    """Decode the items of a JSON list or object while the response is read.
+
+    Only the current chunk and item are kept in memory instead of the whole
+    body plus everything decoded from it. Members of an object are yielded by
+    value, Vultr list responses repeat the key in the item anyway.
+    """
+
+    CHUNK_SIZE = 65536
+    WHITESPACE = ' \t\n\r'
+    DELIMITERS = WHITESPACE + ',:]}'
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.fileobj.read(self.CHUNK_SIZE)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def _peek(self):
+        # Skip whitespace, return the next char without consuming it or '' at the end
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError("Expecting one of '%s' but got '%s'" % (chars, char))
+        self.pos += 1
+        return char
+
+    def _decode(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number cut by the end of the chunk decodes as well, e.g. '3.' of '3.14',
+                # it is complete only if a delimiter follows
+                complete = end < len(self.buffer) and (
+                    not isinstance(value, integer_types + (float,)) or self.buffer[end] in self.DELIMITERS
+                )
+                if complete or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def __iter__(self):
+        char = self._peek()
+        if char not in ('{', '['):
+            # Empty body or no collection, nothing to iterate
+            if char:
+                self._decode()
+            return
+
+        closing = '}' if char == '{' else ']'
+        self.pos += 1
+        if self._peek() == closing:
+            return
+
+        while True:
+            if closing == '}':
+                self._decode()
+                self._expect(':')
+            yield self._decode()
+            if self._expect(',' + closing) == closing:
+                return
+
+
+class VultrRetryPolicy:
+    """Decide whether a failed API request is retried and how long to wait before.
+
+    Connection errors, timeouts and the configured status codes (rate limiting
+    and server errors) are retried, everything else e.g. 400, 403 or 404 is
+    terminal. A Retry-After header sent by the API is honoured up to the max delay.
+
+    The backoff uses decorrelated jitter: every attempt draws a fresh delay
+    between 1 second and three times the previous delay, so concurrent forks
+    spread out instead of retrying in lockstep.
+    """
+
+    def __init__(self, retries, max_delay, status_codes):
+        self.retries = retries
+        self.max_delay = max_delay
+        self.status_codes = frozenset(status_codes)
+
+    def is_retryable(self, info):
+        if info.get('retryable') is False:
+            return False
+        status = info.get('status')
+        # Transports report connection resets and timeouts with status -1
+        return status == -1 or status in self.status_codes
+
+    @staticmethod
+    def get_retry_after(info):
+        retry_after = info.get('retry-after')
+        if not retry_after:
+            return None
+        try:
+            return max(0, int(retry_after))
+        except ValueError:
+            pass
+        retry_date = email.utils.parsedate_tz(retry_after)
+        if retry_date is None:
+            return None
+        return max(0, email.utils.mktime_tz(retry_date) - time.time())
+
+    def get_delay(self, info, previous_delay=1):
+        retry_after = self.get_retry_after(info)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, 1)
+        else:
+            delay = random.uniform(1, max(1, previous_delay * 3))
+        return min(self.max_delay, delay)
+
+    def run(self, attempt, backoff):
+        """Call attempt until it returns status 200, fails terminally or no retry is left.
+
+        attempt(retry, info) gets the info of the previous attempt, None at first,
+        and returns body and info. backoff(delay, info) waits before the next
+        attempt and may raise to give up early, e.g. at a deadline. Return body and
+        info of the last attempt and the number of attempts.
+        """
+        delay = 1
+        res = info = None
+        for retry in range(0, self.retries):
+            res, info = attempt(retry, info)
+            if info.get('status') == 200 or not self.is_retryable(info):
+                return res, info, retry + 1
+
+            if retry + 1 < self.retries:
+                delay = self.get_delay(info, delay)
+                backoff(delay, info)
+        return res, info, self.retries
+
+
+class VultrRateLimiter:
+    """Token bucket shared by all processes using the same API account on this host.
+
+    The state of the bucket is kept in a small file in the state dir and updated
+    under an exclusive lock. Every request takes a token; if none is left, the
+    token is borrowed and the process sleeps until its slot is due, so forks
+    pace themselves instead of colliding and backing off.
+    """
+
+    def __init__(self, rate, state_file):
+        self.rate = float(rate)
+        self.burst = max(1.0, self.rate)
+        self.state_file = state_file
+
+    def acquire(self):
+        try:
+            fd = open_state_file(self.state_file)
+        except (IOError, OSError):
+            return 0
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            now = time.time()
+            try:
+                tokens, timestamp = [float(x) for x in to_text(os.read(fd, 64)).split()]
+            except ValueError:
+                tokens, timestamp = self.burst, now
+            tokens = min(self.burst, tokens + (now - timestamp) * self.rate) - 1
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, to_bytes("%f %f" % (tokens, now)))
+        finally:
+            os.close(fd)
+
+        delay = -tokens / self.rate if tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class VultrCircuitBreaker:
+    """Circuit breaker shared by all processes using the same API endpoint on this host.
+
+    Consecutive failures of all forks are counted in a state file in the state dir,
+    updated under an exclusive lock. After threshold failures the circuit opens
+    and requests fail fast for the cooldown. Then it is half-open and lets a single
+    probe request through: a success closes the circuit, a failure opens it again.
+    Only connection errors and server errors count as failures. Rate limiting,
+    a 429 or a 503 which the v1 API returns when rate limited, or any response
+    with a Retry-After header, does not indicate an outage and leaves the count
+    as it is.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold, cooldown, state_file):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state_file = state_file
+
+    @staticmethod
+    def is_rate_limited(info):
+        return info.get('status') in (429, 503) or bool(info.get('retry-after'))
+
+    @staticmethod
+    def is_failure(info):
+        status = info.get('status')
+        return status == -1 or (status is not None and status >= 500)
+
+    def _update(self, func):
+        """Apply func to the state under the lock, return its result and the state transition."""
+        try:
+            fd = open_state_file(self.state_file)
+        except (IOError, OSError):
+            return True, None, None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                state, failures, opened_at, probe_at = to_text(os.read(fd, 128)).split()
+                state = {
+                    'state': state,
+                    'failures': int(failures),
+                    'opened_at': float(opened_at),
+                    'probe_at': float(probe_at),
+                }
+            except ValueError:
+                state = {
+                    'state': self.CLOSED,
+                    'failures': 0,
+                    'opened_at': 0.0,
+                    'probe_at': 0.0,
+                }
+            new_state, result = func(dict(state), time.time())
+            if new_state != state:
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, to_bytes("%(state)s %(failures)d %(opened_at)f %(probe_at)f" % new_state))
+        finally:
+            os.close(fd)
+
+        transition = None
+        if new_state['state'] != state['state']:
+            transition = (state['state'], new_state['state'])
+        return result, new_state['state'], transition
+
+    def allow(self):
+        """Return whether a request may be sent, the state and the state transition if any."""
+        def update(state, now):
+            if state['state'] == self.OPEN and now - state['opened_at'] >= self.cooldown:
+                state['state'] = self.HALF_OPEN
+                state['probe_at'] = 0.0
+            if state['state'] == self.CLOSED:
+                return state, True
+            # Another probe only if the last one did not report back in time
+            if state['state'] == self.HALF_OPEN and now - state['probe_at'] >= self.cooldown:
+                state['probe_at'] = now
+                return state, True
+            return state, False
+        return self._update(update)
+
+    def record(self, info):
+        """Record the outcome of a request, return the state and the state transition if any."""
+        def update(state, now):
+            if self.is_rate_limited(info):
+                return state, None
+            if not self.is_failure(info):
+                state.update({
+                    'state': self.CLOSED,
+                    'failures': 0,
+                })
+                return state, None
+            state['failures'] += 1
+            if state['state'] != self.OPEN and (state['state'] == self.HALF_OPEN or state['failures'] >= self.threshold):
+                state['state'] = self.OPEN
+                state['opened_at'] = now
+            return state, None
+        return self._update(update)[1:]
+
+
+class VultrDiskCache:
+    """Persistent cache of API responses shared by all module runs on this host.
+
+    Every entry is a file, written to a temp file first and renamed into
+    place, so concurrent readers see either the old or the new content but
+    never a partial write. An entry expires by the age of its file.
+
+    Entries of set() are JSON documents, entries of writer() are a JSON header
+    line followed by a raw response body, read back by get_body().
+    """
+
+    def __init__(self, cache_dir, namespace):
+        self.cache_dir = cache_dir
+        self.namespace = namespace
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, '%s-%s.json' % (self.namespace, key))
+
+    def _open(self, key, ttl):
+        path = self._get_path(key)
+        try:
+            if time.time() - os.stat(path).st_mtime > ttl:
+                return None
+            return open(path, 'rb')
+        except (IOError, OSError):
+            return None
+
+    def get(self, key, ttl):
+        f = self._open(key, ttl)
+        if f is None:
+            return None
+        try:
+            with f:
+                return json.loads(to_text(f.read()))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def get_body(self, key, ttl):
+        """Return the header of an entry of writer() and its body as file object positioned at the start."""
+        f = self._open(key, ttl)
+        if f is None:
+            return None, None
+        try:
+            return json.loads(to_text(f.readline())), f
+        except (IOError, OSError, ValueError):
+            f.close()
+            return None, None
+
+    def _mkstemp(self, key):
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir, 0o700)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.%s-' % key)
+        return os.fdopen(fd, 'wb'), tmp_path
+
+    def set(self, key, value):
+        try:
+            f, tmp_path = self._mkstemp(key)
+            with f:
+                f.write(to_bytes(json.dumps(value)))
+            os.rename(tmp_path, self._get_path(key))
+        except (IOError, OSError):
+            pass
+
+    def writer(self, key, header):
+        """Return a VultrDiskCacheWriter of an entry with a header and a body written in chunks."""
+        try:
+            f, tmp_path = self._mkstemp(key)
+        except (IOError, OSError):
+            return VultrDiskCacheWriter(None, None, None)
+        writer = VultrDiskCacheWriter(f, tmp_path, self._get_path(key))
+        writer.write(to_bytes(json.dumps(header)) + b'\n')
+        return writer
+
+    def invalidate(self, prefix):
+        prefix = '%s-%s' % (self.namespace, prefix)
+        try:
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(self.cache_dir, name))
+        except (IOError, OSError):
+            pass
+
+
+class VultrDiskCacheWriter:
+    """Entry of the persistent cache written in chunks, renamed into place on commit."""
+
+    def __init__(self, fileobj, tmp_path, path):
+        self.fileobj = fileobj
+        self.tmp_path = tmp_path
+        self.path = path
+
+    def write(self, data):
+        if self.fileobj is None:
+            return
+        try:
+            self.fileobj.write(data)
+        except (IOError, OSError):
+            self.abort()
+
+    def commit(self):
+        if self.fileobj is None:
+            return
+        try:
+            self.fileobj.close()
+            os.rename(self.tmp_path, self.path)
+        except (IOError, OSError):
+            self.abort()
+        self.fileobj = None
+
+    def abort(self):
+        if self.fileobj is None:
+            return
+        try:
+            self.fileobj.close()
+            os.remove(self.tmp_path)
+        except (IOError, OSError):
+            pass
+        self.fileobj = None
+
+
+class VultrSingleFlight:
+    """Share the response of identical requests issued at the same time.
+
+    The first caller of a key does the request while concurrent callers wait
+    for its response. The response is also served to callers within a short
+    window after, unless the group of the key, e.g. the resource family, was
+    invalidated by a change meanwhile.
+    """
+
+    def __init__(self, window=1):
+        self.window = window
+        self._lock = threading.Lock()
+        self._flights = dict()
+
+    def do(self, key, group, func):
+        """Return the result of func for the key and whether it was shared."""
+        with self._lock:
+            self._prune(time.time())
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = {
+                    'group': group,
+                    'event': threading.Event(),
+                    'result': None,
+                    'finished': None,
+                }
+                self._flights[key] = flight
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            flight['event'].wait()
+            # The leader failed, do the request on our own
+            if flight['result'] is None:
+                return func(), False
+            return flight['result'], True
+
+        try:
+            flight['result'] = func()
+        finally:
+            flight['finished'] = time.time()
+            flight['event'].set()
+            if flight['result'] is None:
+                self._discard(key, flight)
+        return flight['result'], False
+
+    def _prune(self, now):
+        # Drop the flights finished before the window, their results may be large lists
+        for key, flight in list(self._flights.items()):
+            if flight['finished'] is not None and now - flight['finished'] > self.window:
+                del self._flights[key]
+
+    def _discard(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def invalidate(self, group):
+        with self._lock:
+            for key, flight in list(self._flights.items()):
+                if flight['group'] == group:
+                    del self._flights[key]
+
+
+class VultrV2Pager:
+    """Iterate the items of a cursor paginated v2 API list.
+
+    fetch_page is called with the cursor of a page (None for the first one) and
+    returns the decoded page. While the items of a page are consumed, the next
+    page is fetched in a background thread; a consumer which stops iterating,
+    e.g. because a lookup is satisfied, skips the remaining pages.
+    """
+
+    def __init__(self, fetch_page, key):
+        self.fetch_page = fetch_page
+        self.key = key
+
+    def _fetch_async(self, cursor):
+        pending = {
+            'thread': None,
+            'page': None,
+            'error': None,
+        }
+
+        def run():
+            try:
+                pending['page'] = self.fetch_page(cursor)
+            except Exception as e:
+                # Raised again in the consuming thread
+                pending['error'] = e
+
+        pending['thread'] = threading.Thread(target=run)
+        pending['thread'].daemon = True
+        pending['thread'].start()
+        return pending
+
+    def __iter__(self):
+        page = self.fetch_page(None)
+        while True:
+            cursor = ((page.get('meta') or {}).get('links') or {}).get('next')
+            pending = self._fetch_async(cursor) if cursor else None
+
+            for item in page.get(self.key) or []:
+                yield item
+
+            if pending is None:
+                return
+
+            pending['thread'].join()
+            if pending['error'] is not None:
+                raise pending['error']
+            page = pending['page'] or {}
+
+
+class VultrSchema:
+    """Schema of a returned resource, compiled once into a list of operations.
+
+    Each operation is a tuple of the key in the API response, the converter to
+    apply and the key to rename it to. Keys which are only kept as they are need
+    no operation at all.
+    """
+
+    CONVERTERS = {
+        'int': int,
+        'float': float,
+        'bool': lambda value: value == 'yes',
+    }
+
+    def __init__(self, schema):
+        self.keys = frozenset(schema.keys())
+        self.operations = []
+        for search_key, config in schema.items():
+            converter = self.CONVERTERS.get(config.get('convert_to'))
+            if 'transform' in config:
+                converter = self._chain(converter, config['transform'])
+
+            if converter is not None or 'key' in config:
+                self.operations.append((search_key, converter, config.get('key')))
+
+    @staticmethod
+    def _chain(convert, transform):
+        if convert is None:
+            return transform
+        return lambda value: transform(convert(value))
+
+    def normalize(self, resource, remove_missing_keys=True):
+        if remove_missing_keys:
+            keys = self.keys
+            for field in [field for field in resource if field not in keys]:
+                del resource[field]
+
+        for search_key, converter, key in self.operations:
+            if search_key not in resource:
+                continue
+
+            if key is None:
+                resource[search_key] = converter(resource[search_key])
+            elif converter is None:
+                resource[key] = resource.pop(search_key)
+            else:
+                resource[key] = converter(resource.pop(search_key))
+
+        return resource
+
+
+class VultrBroker:
+    """Broker process forwarding the API requests of all module runs on this host.
+
+    Modules connect to a Unix socket instead of the API and send one request per
+    connection as a JSON line. The broker keeps the HTTP connections to the API
+    alive between module runs and serves the catalog lists of the persistent
+    cache from memory. It shuts down after being idle for idle_timeout seconds.
+    """
+
+    def __init__(self, socket_path, idle_timeout=VULTR_API_BROKER_IDLE_TIMEOUT):
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.connection_pools = {
+            True: VultrConnectionPool(validate_certs=True),
+            False: VultrConnectionPool(validate_certs=False),
+        }
+        self.cache = dict()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.last_active = time.time()
+
+    @staticmethod
+    def _get_resource(url):
+        path = urlparse(url).path.split('/')
+        return path[2] if len(path) > 2 else None
+
+    def request(self, url, method, data, headers, timeout, validate_certs=True, cache_ttl=None):
+        """Send a request, a GET response is cached for cache_ttl seconds if given.
+
+        A cache_ttl of 0 fetches the response and stores it for later requests.
+        """
+        resource = self._get_resource(url)
+        cache_key = (headers.get('API-Key'), url)
+        cacheable = method == "GET" and cache_ttl is not None
+
+        if cacheable:
+            with self.lock:
+                cached = self.cache.get(cache_key)
+            if cached and time.time() - cached[0] < cache_ttl:
+                return cached[1], cached[2]
+        elif method != "GET":
+            # Changes may outdate the cached lists of the resource
+            with self.lock:
+                for key in [key for key in self.cache if self._get_resource(key[1]) == resource]:
+                    del self.cache[key]
+
+        body, info = self.connection_pools[validate_certs].request(
+            url=url,
+            method=method,
+            data=data,
+            headers=headers,
+            timeout=timeout,
+        )
+        # Like the persistent cache, empty lists are not kept
+        if cacheable and info['status'] == 200 and body and body.strip() not in (b'[]', b'{}'):
+            with self.lock:
+                self.cache[cache_key] = (time.time(), body, info)
+        return body, info
+
+    def _handle(self, rfile, wfile):
+        with self.lock:
+            self.active += 1
+        try:
+            request = json.loads(to_text(rfile.readline()))
+            body, info = self.request(**request)
+            info = dict(info)
+            if info.get('body') is not None:
+                info['body'] = to_text(info['body'], errors='surrogate_or_replace')
+            wfile.write(to_bytes(json.dumps({
+                'body': to_text(base64.b64encode(body)) if body is not None else None,
+                'info': info,
+            })) + b'\n')
+        except (ValueError, TypeError, KeyError, IOError, OSError, socket.error):
+            # The client gets a closed connection
+            pass
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.last_active = time.time()
+
+    def serve(self):
+        """Serve requests on the socket until idle for idle_timeout seconds."""
+        broker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                broker._handle(self.rfile, self.wfile)
+
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        server.daemon_threads = True
+        server.timeout = 1
+        try:
+            while self.active or time.time() - self.last_active < self.idle_timeout:
+                server.handle_request()
+        finally:
+            server.server_close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+
+class VultrBrokerClient:
+    """Send API requests through the broker process, see VultrBroker."""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+
+    @staticmethod
+    def get_socket_path():
+        return os.path.join(get_state_dir(), 'broker.sock')
+
+    def get_peer_uid(self, sock):
+        """Return the uid of the process listening on the socket, or the owner of the socket file."""
+        if hasattr(socket, 'SO_PEERCRED'):
+            credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+            return struct.unpack('3i', credentials)[1]
+        return os.lstat(self.socket_path).st_uid
+
+    def connect(self, timeout=None):
+        """Connect to the broker, which has to be run by the same user, as the requests carry the API key."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.socket_path)
+            peer_uid = self.get_peer_uid(sock)
+            if peer_uid != os.getuid():
+                raise socket.error(errno.EPERM, "Broker socket %s is served by uid %s" % (self.socket_path, peer_uid))
+        except (socket.error, OSError):
+            sock.close()
+            raise
+        return sock
+
+    def is_running(self):
+        try:
+            self.connect(timeout=1).close()
+            return True
+        except (socket.error, OSError):
+            return False
+
+    def start(self, idle_timeout=VULTR_API_BROKER_IDLE_TIMEOUT):
+        """Start the broker unless it is running already, return whether it runs."""
+        if self.is_running():
+            return True
+
+        try:
+            lock_fd = open_state_file(self.socket_path + '.lock')
+        except (IOError, OSError):
+            return False
+        try:
+            # Only one of the forks starts the broker
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            if self.is_running():
+                return True
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+            pid = os.fork()
+            if pid == 0:
+                self._run_daemon(idle_timeout)
+            os.waitpid(pid, 0)
+
+            for i in range(50):
+                if self.is_running():
+                    return True
+                time.sleep(0.02)
+            return False
+        except (IOError, OSError):
+            return False
+        finally:
+            os.close(lock_fd)
+
+    def _run_daemon(self, idle_timeout):
+        # Detach like a daemon, the module output must not be held open
+        try:
+            os.setsid()
+            if os.fork():
+                os._exit(0)
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+            os.closerange(3, 65536)
+            os.umask(0o077)
+            VultrBroker(self.socket_path, idle_timeout).serve()
+        finally:
+            os._exit(0)
+
+    def request(self, url, method, data, headers, timeout, validate_certs=True, cache_ttl=None):
+        """Return body and info like VultrConnectionPool.request, None and None if the broker is not running."""
+        try:
+            sock = self.connect(timeout=timeout + 5)
+        except (socket.error, OSError):
+            return None, None
+
+        try:
+            sock.sendall(to_bytes(json.dumps({
+                'url': url,
+                'method': method,
+                'data': data,
+                'headers': headers,
+                'timeout': timeout,
+                'validate_certs': validate_certs,
+                'cache_ttl': cache_ttl,
+            })) + b'\n')
+            rfile = sock.makefile('rb')
+            response = json.loads(to_text(rfile.readline()))
+            rfile.close()
+        except (socket.error, ValueError) as e:
+            return None, {'status': -1, 'msg': "Request through the broker failed: %s" % to_native(e), 'url': url}
+        finally:
+            sock.close()
+
+        body = response['body']
+        if body is not None:
+            body = base64.b64decode(body)
+        return body, response['info']
+
+
+class VultrCassette:
+    """Record the API interactions of a module run to a cassette file or replay them.
+
+    Selected by the ENV variable VULTR_API_CASSETTE pointing to the cassette, a
+    JSON lines file with one request and its response per line, and
+    VULTR_API_CASSETTE_MODE, either record or replay (default). Recording
+    appends to the cassette. Replaying serves every request by the first
+    recorded interaction with the same method, path and data not served yet,
+    delayed by VULTR_API_CASSETTE_LATENCY seconds or the recorded duration if
+    set to recorded. Replays are deterministic and need no network access.
+
+    Secrets are replaced by VULTR_API_REDACTED before recording: the fields of
+    VULTR_API_SECRET_FIELDS in response bodies and password fields of the
+    request data, e.g. of vultr_user. Replays match the request data redacted
+    the same way and return the redacted bodies. The API key is never recorded.
+    Cassettes may still hold other private data like IPs, user data or SSH
+    keys, review them before publishing.
+    """
+
+    MODES = ('record', 'replay')
+
+    def __init__(self, path, mode='replay', latency=None):
+        if mode not in self.MODES:
+            raise ValueError("Cassette mode must be one of %s, got %s" % (', '.join(self.MODES), mode))
+        self.path = path
+        self.mode = mode
+        self.latency = latency if latency == 'recorded' else float(latency or 0)
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.interactions = []
+        if mode == 'replay':
+            with open(path, 'rb') as f:
+                self.interactions = [json.loads(to_text(line)) for line in f if line.strip()]
+
+    @staticmethod
+    def is_secret(key):
+        key = key.lower()
+        if key.endswith('[]'):
+            key = key[:-2]
+        return key in VULTR_API_SECRET_FIELDS or 'password' in key
+
+    @classmethod
+    def redact_data(cls, data):
+        """Return urlencoded request data with the secret fields redacted."""
+        if not data:
+            return data
+        fields = parse_qsl(data, keep_blank_values=True)
+        if not any(cls.is_secret(key) for key, value in fields):
+            return data
+        return urlencode([(key, VULTR_API_REDACTED if cls.is_secret(key) else value) for key, value in fields])
+
+    @classmethod
+    def _redact(cls, value):
+        if isinstance(value, dict):
+            return dict((k, VULTR_API_REDACTED if cls.is_secret(k) and v else cls._redact(v)) for k, v in value.items())
+        if isinstance(value, list):
+            return [cls._redact(v) for v in value]
+        return value
+
+    @classmethod
+    def redact_body(cls, body):
+        """Return a JSON response body with the secret fields redacted, other bodies as they are."""
+        try:
+            value = json.loads(body)
+        except ValueError:
+            return body
+        redacted = cls._redact(value)
+        return body if redacted == value else json.dumps(redacted)
+
+    def record(self, method, path, data, body, info, duration):
+        if body is not None:
+            body = self.redact_body(to_text(body, errors='surrogate_or_strict'))
+        interaction = {
+            'request': {
+                'method': method,
+                'path': path,
+                'data': self.redact_data(data),
+            },
+            'response': {
+                'info': dict((k, v) for k, v in info.items() if k not in ('url', 'body')),
+                'body': body,
+            },
+            'duration': round(duration, 3),
+        }
+        with self.lock:
+            self.calls += 1
+            try:
+                with open(self.path, 'ab') as f:
+                    f.write(to_bytes(json.dumps(interaction, sort_keys=True)) + b'\n')
+            except (IOError, OSError) as e:
+                raise VultrAPIError("Could not record to cassette %s: %s" % (self.path, to_native(e)))
+
+    def replay(self, method, path, data):
+        data = self.redact_data(data)
+        with self.lock:
+            self.calls += 1
+            for interaction in self.interactions:
+                request = interaction['request']
+                if not interaction.get('served') and (request['method'], request['path'], request['data']) == (method, path, data):
+                    interaction['served'] = True
+                    break
+            else:
+                raise VultrAPIError("No interaction left in cassette %s for URL %s, method %s with data %s" % (self.path, path, method, data))
+
+        delay = interaction['duration'] if self.latency == 'recorded' else self.latency
+        if delay:
+            time.sleep(delay)
+
+        info = dict(interaction['response']['info'])
+        body = interaction['response']['body']
+        if body is not None:
+            body = to_bytes(body, errors='surrogate_or_strict')
+        if info['status'] >= 400:
+            info['body'] = body
+        return body, info
+
+
+class VultrTraceSpan:
+    """Timed span of a trace, emitted when the with block is left."""
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+
+    def set(self, **kwargs):
+        self.args.update(kwargs)
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            self.args['error'] = to_native(exc_value)
+        self.tracer.emit(self.name, self.cat, self.start, time.time(), self.args)
+        return False
+
+
+class VultrNullSpan:
+    """Span doing nothing, used while tracing is disabled."""
+
+    def set(self, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+
+VULTR_NULL_SPAN = VultrNullSpan()
+
+
+class VultrTracer:
+    """Write spans as trace events to a JSON lines file.
+
+    Selected by the ENV variable VULTR_API_TRACE pointing to the file. Every
+    line is a complete event of the Chrome trace event format, named by the
+    process of the module run, so the spans of all forks can be viewed on one
+    timeline in chrome://tracing or Perfetto after wrapping the lines into a
+    JSON array, e.g. with jq -s . trace.jsonl > trace.json. Each event is
+    appended by a single write to not interleave with the events of other
+    processes.
+    """
+
+    def __init__(self, path, process_name):
+        self.path = path
+        self.process_name = process_name
+        self.pid = os.getpid()
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._write({
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': self.pid,
+            'tid': 0,
+            'args': {'name': "%s[%s]" % (process_name, self.pid)},
+        })
+
+    @classmethod
+    def from_env(cls, process_name):
+        """Return a tracer if enabled by VULTR_API_TRACE, None otherwise."""
+        path = os.environ.get('VULTR_API_TRACE')
+        if not path:
+            return None
+        return cls(os.path.expanduser(path), process_name)
+
+    def span(self, name, cat='api', **args):
+        return VultrTraceSpan(self, name, cat, args)
+
+    def emit(self, name, cat, start, end, args):
+        args['module'] = self.process_name
+        self._write({
+            'name': name,
+            'cat': cat,
+            'ph': 'X',
+            'ts': int(start * 1000000),
+            'dur': int((end - start) * 1000000),
+            'pid': self.pid,
+            'tid': threading.current_thread().ident,
+            'args': args,
+        })
+
+    def _write(self, event):
+        try:
+            os.write(self.fd, to_bytes(json.dumps(event, default=to_native)) + b'\n')
+        except (IOError, OSError):
+            # Tracing must never fail the module run
+            pass
+
+
+class VultrProfiler:
+    """Profile a module run with cProfile and write the stats at exit.
+
+    Selected by the ENV variable VULTR_API_PROFILE pointing to a directory.
+    Every run writes <module>-<timestamp>-<pid>.prof, readable by pstats or
+    snakeviz, and a .txt summary next to it breaking down the time spent in
+    the HTTP requests, JSON decoding, normalization and sleeps, with the
+    callers of the sleeps to tell waiting for a state from backoff. Only the
+    main thread is profiled, not the workers of api_query_many.
+    """
+
+    FUNCTIONS = r'fetch_url|_fetch|\(loads\)|_decode|normalize|sleep'
+
+    def __init__(self, profile_dir, name):
+        if not os.path.isdir(profile_dir):
+            os.makedirs(profile_dir, 0o700)
+        self.path = os.path.join(profile_dir, "%s-%s-%s.prof" % (name, time.strftime('%Y%m%dT%H%M%S'), os.getpid()))
+        self.profiler = cProfile.Profile()
+
+    @classmethod
+    def from_env(cls, name):
+        """Return a profiler if enabled by VULTR_API_PROFILE and cProfile is available, None otherwise."""
+        profile_dir = os.environ.get('VULTR_API_PROFILE')
+        if not profile_dir or not HAS_CPROFILE:
+            return None
+        return cls(os.path.expanduser(profile_dir), name)
+
+    def start(self):
+        self.profiler.enable()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self.profiler.disable()
+        try:
+            self.profiler.dump_stats(self.path)
+            with open(self.path[:-len('.prof')] + '.txt', 'w') as f:
+                stats = pstats.Stats(self.profiler, stream=f)
+                stats.sort_stats('cumulative')
+                stats.print_stats(self.FUNCTIONS)
+                stats.print_callers('sleep')
+                stats.print_stats(30)
+        except (IOError, OSError):
+            # Profiling must never fail the module run
+            pass
+
+
+class VultrAPIClient:
+    """Send GET requests to the API outside of a module run, e.g. by the inventory plugin.
+
+    Shares the connection pool, the retry policy and the tracing with the
+    modules: every attempt is bound by the timeout, connection errors, rate
+    limiting and server errors are retried with backoff.
+    """
+
+    def __init__(self, api_key, api_endpoint=VULTR_API_ENDPOINT, timeout=60, retries=5, retry_max_delay=12,
+                 retry_status_codes=None, connection_pool=None, tracer=None):
+        self.api_endpoint = api_endpoint
+        self.timeout = timeout
+        self.retry_policy = VultrRetryPolicy(
+            retries=retries,
+            max_delay=retry_max_delay,
+            status_codes=retry_status_codes or VULTR_API_RETRY_STATUS_CODES,
+        )
+        self.connection_pool = connection_pool if connection_pool is not None else VultrConnectionPool()
+        self.use_connection_pool = not VultrConnectionPool.is_proxied(api_endpoint)
+        self.tracer = tracer
+        self.headers = {
+            'API-Key': "%s" % api_key,
+            'Authorization': "Bearer %s" % api_key,
+            'User-Agent': VULTR_USER_AGENT,
+            'Accept': 'application/json',
+        }
+
+    def trace(self, name, cat='api', **args):
+        if self.tracer is None:
+            return VULTR_NULL_SPAN
+        return self.tracer.span(name, cat, **args)
+
+    def _fetch(self, url, stream=False):
+        if self.use_connection_pool:
+            return self.connection_pool.request(url, headers=self.headers, timeout=self.timeout, stream=stream)
+
+        try:
+            response = open_url(url, headers=self.headers, http_agent=VULTR_USER_AGENT, timeout=self.timeout)
+        except HTTPError as e:
+            info = dict((k.lower(), v) for k, v in e.headers.items()) if e.headers else dict()
+            info.update({
+                'status': e.code,
+                'msg': "HTTP Error %s: %s" % (e.code, e.reason),
+                'url': url,
+                'body': e.read(),
+            })
+            return None, info
+        except Exception as e:
+            return None, {'status': -1, 'msg': "Request failed: %s" % to_native(e), 'url': url}
+
+        info = dict((k.lower(), v) for k, v in response.headers.items())
+        info.update({
+            'status': response.getcode(),
+            'msg': "OK",
+            'url': url,
+        })
+        if stream:
+            return response, info
+        return response.read(), info
+
+    def get(self, path, stream=False):
+        """Return the body, or the response to read it from if streamed, and the info of a GET request."""
+        url = self.api_endpoint + path
+
+        def attempt(retry, info):
+            with self.trace('attempt', cat='http', path=path, method='GET', retry=retry) as attempt_span:
+                res, info = self._fetch(url, stream=stream)
+                if self.tracer is not None:
+                    attempt_span.set(
+                        status=info['status'],
+                        bytes=len(res) if isinstance(res, (bytes, str)) else int(info.get('content-length') or 0),
+                    )
+            return res, info
+
+        def backoff(delay, info):
+            with self.trace('backoff', cat='sleep', delay=delay):
+                time.sleep(delay)
+
+        with self.trace("GET %s" % path.split('?')[0], cat='request', path=path, method='GET') as span:
+            res, info, attempts = self.retry_policy.run(attempt, backoff)
+            span.set(status=info['status'])
+
+        if info['status'] != 200:
+            raise VultrAPIError("URL %s, returned %s after %s attempts, with body: %s %s" % (
+                url,
+                info['status'],
+                attempts,
+                info['msg'],
+                info.get('body'),
+            ))
+        return res, info
+
+
 class Vultr:
 
     def __init__(self, module, namespace):
@@ -53,6 +1552,12 @@ class Vultr:
         # For caching HTTP API responses
         self.api_cache = dict()
 
+        # Lookup indexes of the cached responses, built on demand
+        self.api_cache_index = dict()
+
+        # Resources of which the cached response was served by the persistent cache
+        self.api_cache_from_disk = set()
+
         try:
             config = self.read_env_variables()
             config.update(Vultr.read_ini_config(self.module.params.get('api_account')))
@@ -65,11 +1570,29 @@ class Vultr:
                 'api_timeout': self.module.params.get('api_timeout') or int(config.get('timeout') or 60),
                 'api_retries': self.module.params.get('api_retries') or int(config.get('retries') or 5),
                 'api_retry_max_delay': self.module.params.get('api_retry_max_delay') or int(config.get('retry_max_delay') or 12),
+                'api_deadline': self.module.params.get('api_deadline') or int(config.get('deadline') or 0),
+                'api_time_budget': self.module.params.get('api_time_budget') or int(config.get('time_budget') or 0),
+                'api_retry_status_codes': self.module.params.get('api_retry_status_codes') or [
+                    int(code) for code in config.get('retry_status_codes', '').split(',') if code.strip()
+                ] or VULTR_API_RETRY_STATUS_CODES,
                 'api_endpoint': self.module.params.get('api_endpoint') or config.get('endpoint') or VULTR_API_ENDPOINT,
+                'api_rate_limit': self.module.params.get('api_rate_limit') or float(config.get('rate_limit') or 0),
+                'api_circuit_threshold': self.module.params.get('api_circuit_threshold') or int(config.get('circuit_threshold') or 0),
+                'api_circuit_cooldown': self.module.params.get('api_circuit_cooldown') or int(config.get('circuit_cooldown') or 30),
+                'api_cache_mode': self.module.params.get('api_cache_mode') or config.get('cache_mode') or 'enabled',
+                'api_metrics': self.module.params.get('api_metrics') if self.module.params.get('api_metrics') is not None
+                else boolean(config.get('metrics') or False),
+                'api_broker': self.module.params.get('api_broker') if self.module.params.get('api_broker') is not None
+                else boolean(config.get('broker') or False),
+                'api_cache_dir': os.path.expanduser(
+                    config.get('cache_dir') or os.path.join('~', '.cache', 'ansible-vultr')
+                ),
             }
-        except ValueError as e:
+        except (TypeError, ValueError) as e:
             self.fail_json(msg="One of the following settings, "
-                               "in section '%s' in the ini config file has not an int value: timeout, retries. "
+                               "in section '%s' in the ini config file has not a valid value: "
+                               "timeout, retries, retry_max_delay, deadline, time_budget, retry_status_codes, rate_limit, "
+                               "circuit_threshold, circuit_cooldown, metrics, broker. "
                                "Error was %s" % (self.module.params.get('api_account'), to_native(e)))
 
         if not self.api_config.get('api_key'):
@@ -81,9 +1604,129 @@ class Vultr:
             'api_timeout': self.api_config['api_timeout'],
             'api_retries': self.api_config['api_retries'],
             'api_retry_max_delay': self.api_config['api_retry_max_delay'],
+            'api_deadline': self.api_config['api_deadline'],
+            'api_time_budget': self.api_config['api_time_budget'],
+            'api_retry_status_codes': self.api_config['api_retry_status_codes'],
             'api_endpoint': self.api_config['api_endpoint'],
+            'api_rate_limit': self.api_config['api_rate_limit'],
+            'api_circuit_threshold': self.api_config['api_circuit_threshold'],
+            'api_circuit_cooldown': self.api_config['api_circuit_cooldown'],
+            'api_cache_mode': self.api_config['api_cache_mode'],
         }
 
+        # Identical GET requests at the same time share the response
+        self.single_flight = VultrSingleFlight(window=VULTR_API_COALESCE_WINDOW)
+
+        # Telemetry of the API requests, only collected if enabled
+        self.api_metrics = None
+        if self.api_config['api_metrics']:
+            self.api_metrics = {
+                'requests': dict(),
+                'retries': 0,
+                'backoff_time': 0.0,
+                'rate_limit_time': 0.0,
+                'wait_time': 0.0,
+                'cache_hits': 0,
+                'disk_cache_hits': 0,
+                'cache_misses': 0,
+                'coalesced': 0,
+                'not_modified': 0,
+            }
+            self.result['vultr_api']['api_metrics'] = self.api_metrics
+
+        # Spans of the API requests written to a trace file, only if enabled
+        try:
+            self.tracer = VultrTracer.from_env(self.namespace)
+        except (IOError, OSError) as e:
+            self.fail_json(msg="Could not open the trace file: %s" % to_native(e))
+        if self.tracer is not None:
+            self.result['vultr_api']['api_trace'] = self.tracer.path
+
+        # Requests are recorded or replayed for tests and benchmarks
+        self.cassette = None
+        if os.environ.get('VULTR_API_CASSETTE'):
+            try:
+                self.cassette = VultrCassette(
+                    path=os.environ['VULTR_API_CASSETTE'],
+                    mode=os.environ.get('VULTR_API_CASSETTE_MODE') or 'replay',
+                    latency=os.environ.get('VULTR_API_CASSETTE_LATENCY'),
+                )
+            except (IOError, OSError, ValueError) as e:
+                self.fail_json(msg="Could not load the cassette: %s" % to_native(e))
+            self.result['vultr_api']['api_cassette'] = {
+                'path': self.cassette.path,
+                'mode': self.cassette.mode,
+                'calls': 0,
+            }
+
+        # Catalog lists are cached across module runs, not with cassettes to keep the requests reproducible
+        self.disk_cache = None
+        if self.api_config['api_cache_mode'] != 'disabled' and self.cassette is None:
+            self.disk_cache = VultrDiskCache(
+                cache_dir=self.api_config['api_cache_dir'],
+                namespace=hashlib.sha1(to_bytes("%s %s" % (self.api_config['api_endpoint'], self.api_config['api_key']))).hexdigest(),
+            )
+
+        # Pace requests of all forks using the same account
+        self.rate_limiter = None
+        if self.api_config['api_rate_limit'] > 0 and HAS_FCNTL:
+            try:
+                self.rate_limiter = VultrRateLimiter(
+                    rate=self.api_config['api_rate_limit'],
+                    state_file=get_state_file(
+                        'ratelimit',
+                        self.module.params.get('api_account'),
+                        self.api_config['api_endpoint'],
+                    ),
+                )
+            except (IOError, OSError) as e:
+                self.module.warn("Rate limiting disabled: %s" % to_native(e))
+
+        # Fail fast while the API endpoint is down for all forks
+        self.circuit_breaker = None
+        if self.api_config['api_circuit_threshold'] > 0 and HAS_FCNTL and self.cassette is None:
+            try:
+                self.circuit_breaker = VultrCircuitBreaker(
+                    threshold=self.api_config['api_circuit_threshold'],
+                    cooldown=self.api_config['api_circuit_cooldown'],
+                    state_file=get_state_file('circuit', self.api_config['api_endpoint']),
+                )
+            except (IOError, OSError) as e:
+                self.module.warn("Circuit breaker disabled: %s" % to_native(e))
+        if self.circuit_breaker is not None:
+            self.result['vultr_api']['api_circuit_breaker'] = {
+                'state': VultrCircuitBreaker.CLOSED,
+                'transitions': [],
+            }
+
+        self.retry_policy = VultrRetryPolicy(
+            retries=self.api_config['api_retries'],
+            max_delay=self.api_config['api_retry_max_delay'],
+            status_codes=self.api_config['api_retry_status_codes'],
+        )
+
+        # All API requests of this task have to be done by then
+        self.task_deadline = None
+        if self.api_config['api_time_budget'] > 0:
+            self.task_deadline = time.time() + self.api_config['api_time_budget']
+
+        # Reuse HTTP connections for all requests of this run, unless a proxy has to be used
+        self.connection_pool = VultrConnectionPool(validate_certs=self.module.params.get('validate_certs'))
+        self.result['vultr_api']['api_connections'] = self.connection_pool.stats
+        self.use_connection_pool = not VultrConnectionPool.is_proxied(self.api_config['api_endpoint'])
+
+        # Send the requests through the broker process shared by all module runs
+        self.broker = None
+        if self.api_config['api_broker'] and self.use_connection_pool and HAS_FCNTL and self.cassette is None:
+            try:
+                broker = VultrBrokerClient(VultrBrokerClient.get_socket_path())
+            except (IOError, OSError) as e:
+                self.module.warn("API broker disabled: %s" % to_native(e))
+            else:
+                if broker.start():
+                    self.broker = broker
+        self.result['vultr_api']['api_broker'] = self.broker is not None
+
         # Headers to be passed to the API
         self.headers = {
             'API-Key': "%s" % self.api_config['api_key'],
@@ -91,8 +1734,22 @@ class Vultr:
             'Accept': 'application/json',
         }
 
+        # Profile the rest of the run, started last to not profile the forked broker process
+        try:
+            self.profiler = VultrProfiler.from_env(self.namespace)
+            if self.profiler is not None:
+                self.profiler.start()
+        except (IOError, OSError, ValueError) as e:
+            self.fail_json(msg="Could not start profiling: %s" % to_native(e))
+        if self.profiler is not None:
+            self.result['vultr_api']['api_profile'] = self.profiler.path
+
     def read_env_variables(self):
-        keys = ['key', 'timeout', 'retries', 'retry_max_delay', 'endpoint']
+        keys = [
+            'key', 'timeout', 'retries', 'retry_max_delay', 'deadline', 'time_budget', 'retry_status_codes',
+            'endpoint', 'rate_limit', 'circuit_threshold', 'circuit_cooldown', 'cache_mode', 'cache_dir', 'metrics',
+            'broker',
+        ]
         env_conf = {}
         for key in keys:
             if 'VULTR_API_%s' % key.upper() not in os.environ:
@@ -102,16 +1759,19 @@ class Vultr:
         return env_conf
 
     @staticmethod
-    def read_ini_config(ini_group):
+    def get_ini_config_paths():
         paths = (
             os.path.join(os.path.expanduser('~'), '.vultr.ini'),
             os.path.join(os.getcwd(), 'vultr.ini'),
         )
         if 'VULTR_API_CONFIG' in os.environ:
             paths += (os.path.expanduser(os.environ['VULTR_API_CONFIG']),)
+        return paths
 
+    @staticmethod
+    def read_ini_config(ini_group):
         conf = configparser.ConfigParser()
-        conf.read(paths)
+        conf.read(Vultr.get_ini_config_paths())
 
         if not conf._sections.get(ini_group):
             return dict()
@@ -146,7 +1806,13 @@ class Vultr:
             elif not param and r_value:
                 return "disable"
 
-    def api_query(self, path="/", method="GET", data=None):
+    def api_request(self, path="/", method="GET", data=None, stream=False, cache_ttl=None):
+        try:
+            return self._request(path=path, method=method, data=data, stream=stream, cache_ttl=cache_ttl)
+        except VultrAPIError as e:
+            self.fail_json(msg=to_native(e))
+
+    def _request(self, path="/", method="GET", data=None, stream=False, cache_ttl=None):
         url = self.api_config['api_endpoint'] + path
 
         if data:
@@ -166,31 +1832,124 @@ class Vultr:
             except AttributeError:
                 data = urllib.parse.urlencode(data_encoded) + data_list
 
-        retry_max_delay = self.api_config['api_retry_max_delay']
-        randomness = random.randint(0, 1000) / 1000.0
+        resource = path.split('/')[2] if path.count('/') > 2 else None
+        if method != "GET":
+            # Changes may outdate the cached responses of the resource
+            self.single_flight.invalidate(resource)
+            if self.disk_cache is not None and resource in VULTR_API_CACHE_TTLS:
+                self.disk_cache.invalidate(resource)
+            if self.disk_cache is not None and resource:
+                self.disk_cache.invalidate('conditional-%s-' % resource)
 
-        for retry in range(0, self.api_config['api_retries']):
-            response, info = fetch_url(
-                module=self.module,
-                url=url,
-                data=data,
-                method=method,
-                headers=self.headers,
-                timeout=self.api_config['api_timeout'],
-            )
+            res, info = self._send(url, path, method, data)
+            self.single_flight.invalidate(resource)
+            return res, info
 
-            if info.get('status') == 200:
-                break
+        if stream:
+            return self._send(url, path, method, data, stream=True)
 
-            # Vultr has a rate limiting requests per second, try to be polite
-            # Use exponential backoff plus a little bit of randomness
-            delay = 2 ** retry + randomness
-            if delay > retry_max_delay:
-                delay = retry_max_delay + randomness
-            time.sleep(delay)
+        (res, info), coalesced = self.single_flight.do(
+            key=(url, data),
+            group=resource,
+            func=lambda: self._send(url, path, method, data, cache_ttl=cache_ttl),
+        )
+        if coalesced and self.api_metrics is not None:
+            self.api_metrics['coalesced'] += 1
+        return res, info
 
-        else:
-            self.fail_json(msg="Reached API retries limit %s for URL %s, method %s with data %s. Returned %s, with body: %s %s" % (
+    def get_deadline(self):
+        """Return the time by which an API call has to be done, None if unbounded."""
+        deadlines = []
+        if self.api_config['api_deadline'] > 0:
+            deadlines.append(time.time() + self.api_config['api_deadline'])
+        if self.task_deadline is not None:
+            deadlines.append(self.task_deadline)
+        return min(deadlines) if deadlines else None
+
+    @staticmethod
+    def _deadline_error(url, method, data, info=None):
+        msg = "Reached API deadline for URL %s, method %s with data %s." % (url, method, data)
+        if info is not None:
+            msg += " Returned %s, with body: %s %s" % (info['status'], info['msg'], info.get('body'))
+        return VultrAPIError(msg)
+
+    def trace(self, name, cat='api', **args):
+        """Return a span of the trace, doing nothing if tracing is disabled."""
+        if self.tracer is None:
+            return VULTR_NULL_SPAN
+        return self.tracer.span(name, cat, **args)
+
+    def _send(self, url, path, method, data, stream=False, cache_ttl=None):
+        if self.tracer is None:
+            return self._send_with_retries(url, path, method, data, stream, cache_ttl)
+
+        with self.trace("%s %s" % (method, path.split('?')[0]), cat='request', path=path, method=method) as span:
+            res, info = self._send_with_retries(url, path, method, data, stream, cache_ttl)
+            span.set(status=info['status'])
+        return res, info
+
+    def _send_with_retries(self, url, path, method, data, stream=False, cache_ttl=None):
+        deadline = self.get_deadline()
+
+        def attempt(retry, info):
+            if self.circuit_breaker is not None:
+                allowed, state, transition = self.circuit_breaker.allow()
+                self._record_circuit_state(state, transition)
+                if not allowed:
+                    raise VultrAPIError("Circuit breaker for the Vultr API endpoint %s is open, failing fast for up to %ss. URL %s, method %s with data %s" % (
+                        self.api_config['api_endpoint'],
+                        self.api_config['api_circuit_cooldown'],
+                        url,
+                        method,
+                        data,
+                    ))
+
+            if self.rate_limiter is not None:
+                with self.trace('rate_limit', cat='sleep'):
+                    rate_limit_delay = self.rate_limiter.acquire()
+                if self.api_metrics is not None:
+                    self.api_metrics['rate_limit_time'] += rate_limit_delay
+
+            # The remaining time of the deadline bounds the socket timeout
+            timeout = self.api_config['api_timeout']
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise self._deadline_error(url, method, data, info)
+                timeout = min(timeout, remaining)
+
+            fetch = self.fetch
+            if method == "GET" and self.disk_cache is not None and path.split('?')[0] in VULTR_API_CONDITIONAL_PATHS:
+                fetch = self._fetch_conditional
+
+            with self.trace('attempt', cat='http', path=path, method=method, retry=retry) as span:
+                if self.api_metrics is None:
+                    res, info = fetch(url=url, method=method, data=data, stream=stream, timeout=timeout, cache_ttl=cache_ttl)
+                else:
+                    start = time.time()
+                    res, info = fetch(url=url, method=method, data=data, stream=stream, timeout=timeout, cache_ttl=cache_ttl)
+                    self._record_request_metrics(method, path, time.time() - start, retry)
+                if self.tracer is not None:
+                    span.set(
+                        status=info.get('status'),
+                        bytes=len(res) if isinstance(res, (bytes, str)) else int(info.get('content-length') or 0),
+                    )
+
+            if self.circuit_breaker is not None:
+                self._record_circuit_state(*self.circuit_breaker.record(info))
+            return res, info
+
+        def backoff(delay, info):
+            # No use in waiting for an attempt which would start past the deadline
+            if deadline is not None and time.time() + delay >= deadline:
+                raise self._deadline_error(url, method, data, info)
+            self.sleep(delay, metric='backoff_time')
+
+        # Vultr has a rate limiting requests per second, try to be polite
+        res, info, attempts = self.retry_policy.run(attempt, backoff)
+
+        if info.get('status') != 200 and self.retry_policy.is_retryable(info):
+            raise VultrAPIError("Reached API retries limit %s for URL %s, method %s with data %s. Returned %s, with body: %s %s" % (
                 self.api_config['api_retries'],
                 url,
                 method,
@@ -201,7 +1960,7 @@ class Vultr:
             ))
 
         if info.get('status') != 200:
-            self.fail_json(msg="URL %s, method %s with data %s. Returned %s, with body: %s %s" % (
+            raise VultrAPIError("URL %s, method %s with data %s. Returned %s, with body: %s %s" % (
                 url,
                 method,
                 data,
@@ -210,7 +1969,40 @@ class Vultr:
                 info.get('body')
             ))
 
-        res = response.read()
+        return res, info
+
+    def _record_circuit_state(self, state, transition):
+        circuit_breaker = self.result['vultr_api']['api_circuit_breaker']
+        if state is not None:
+            circuit_breaker['state'] = state
+        if transition is not None:
+            circuit_breaker['transitions'].append({
+                'from': transition[0],
+                'to': transition[1],
+                'time': time.time(),
+            })
+
+    def _record_request_metrics(self, method, path, duration, retry):
+        request_metrics = self.api_metrics['requests'].setdefault("%s %s" % (method, path.split('?')[0]), {
+            'count': 0,
+            'time': 0.0,
+            'max_time': 0.0,
+        })
+        request_metrics['count'] += 1
+        request_metrics['time'] += duration
+        request_metrics['max_time'] = max(request_metrics['max_time'], duration)
+        if retry:
+            self.api_metrics['retries'] += 1
+
+    def sleep(self, delay, metric='wait_time'):
+        """Sleep and account the time in the API metrics, e.g. while waiting for a state."""
+        if self.api_metrics is not None:
+            self.api_metrics[metric] += delay
+        with self.trace(metric.replace('_time', ''), cat='sleep', delay=delay):
+            time.sleep(delay)
+
+    def api_query(self, path="/", method="GET", data=None, cache_ttl=None):
+        res, info = self.api_request(path=path, method=method, data=data, cache_ttl=cache_ttl)
         if not res:
             return {}
 
@@ -219,23 +2011,302 @@ class Vultr:
         except ValueError as e:
             self.module.fail_json(msg="Could not process response into json: %s" % e)
 
-    def query_resource_by_key(self, key, value, resource='regions', query_by='list', params=None, use_cache=False, id_key=None, optional=False):
-        if not value:
-            return {}
+    def api_query_iter(self, path="/", method="GET", data=None):
+        """Yield the items of a list response one by one while it is downloaded."""
+        res, info = self.api_request(path=path, method=method, data=data, stream=True)
+        if res is None:
+            return
+
+        try:
+            for item in VultrJSONStream(res):
+                yield item
+            # Read up to the end of the body, e.g. to keep it for revalidation
+            res.read()
+        except ValueError as e:
+            self.module.fail_json(msg="Could not process response into json: %s" % e)
+        except (http_client.HTTPException, socket.error) as e:
+            self.fail_json(msg="URL %s, method %s. Reading the response failed: %s" % (info['url'], method, to_native(e)))
+        finally:
+            res.close()
+
+    def api_query_many(self, queries, max_workers=VULTR_API_MAX_WORKERS):
+        """Run independent API queries concurrently and return their results in order.
+
+        Each query is a dict of api_query() arguments. The queries share the
+        connection pool, retries, rate limiting and coalescing of api_query().
+        Any other exception of a query, e.g. the SystemExit of fail_json(), is
+        raised again in the calling thread.
+        """
+        if len(queries) < 2:
+            return [self.api_query(**query) for query in queries]
 
+        results = [None] * len(queries)
+        errors = [None] * len(queries)
+        exceptions = []
+        pending = queue.Queue()
+        for index, query in enumerate(queries):
+            pending.put((index, query))
+
+        def worker():
+            while not exceptions:
+                try:
+                    index, query = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    res, info = self._request(**query)
+                    results[index] = (self.module.from_json(to_native(res)) or {}) if res else {}
+                except VultrAPIError as e:
+                    errors[index] = to_native(e)
+                except ValueError as e:
+                    errors[index] = "Could not process response into json: %s" % e
+                except BaseException:
+                    exceptions.append(sys.exc_info())
+                    return
+
+        workers = [threading.Thread(target=worker) for i in range(min(max_workers, len(queries)))]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        if exceptions:
+            reraise(*exceptions[0])
+        for error in errors:
+            if error is not None:
+                self.fail_json(msg=error)
+        return results
+
+    def _fetch_conditional(self, url, method="GET", data=None, stream=False, timeout=None, cache_ttl=None):
+        """Revalidate a response kept in the persistent cache, serve its body if not modified.
+
+        Only the lists of VULTR_API_CONDITIONAL_PATHS are kept, as returned by
+        the API. Responses without an ETag or Last-Modified header are not kept
+        and fetched as usual. Changes of the resource drop the kept responses.
+        """
+        resource = urlparse(url).path.split('/')[2]
+        cache_key = 'conditional-%s-%s' % (resource, hashlib.sha1(to_bytes(url)).hexdigest())
+        validators = kept = None
+        headers = None
+        if self.api_config['api_cache_mode'] == 'enabled':
+            validators, kept = self.disk_cache.get_body(cache_key, VULTR_API_CONDITIONAL_TTL)
+        if validators:
+            headers = dict(self.headers)
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        try:
+            res, info = self.fetch(url=url, method=method, data=data, stream=stream, timeout=timeout, headers=headers, cache_ttl=cache_ttl)
+
+            if info.get('status') == 304 and validators:
+                if stream and hasattr(res, 'read'):
+                    # Hand the connection back to the pool
+                    res.read()
+                if self.api_metrics is not None:
+                    self.api_metrics['not_modified'] += 1
+                info.update({
+                    'status': 200,
+                    'msg': "OK (not modified)",
+                })
+                if stream:
+                    res, kept = kept, None
+                else:
+                    res = kept.read()
+                return res, info
+        finally:
+            if kept is not None:
+                kept.close()
+
+        if info.get('status') == 200 and (info.get('etag') or info.get('last-modified')):
+            # The body is written while it is read, a streamed list is never held in memory
+            writer = self.disk_cache.writer(cache_key, {
+                'etag': info.get('etag'),
+                'last_modified': info.get('last-modified'),
+            })
+            if stream:
+                res = VultrRecordingResponse(res, writer)
+            else:
+                writer.write(res)
+                writer.commit()
+        return res, info
+
+    def fetch(self, url, method="GET", data=None, stream=False, timeout=None, headers=None, cache_ttl=None):
+        if self.cassette is None:
+            return self._fetch(url, method, data, stream, timeout, headers, cache_ttl)
+
+        path = url[len(self.api_config['api_endpoint']):]
+        if self.cassette.mode == 'replay':
+            body, info = self.cassette.replay(method, path, data)
+            info['url'] = url
+        else:
+            start = time.time()
+            body, info = self._fetch(url, method, data, False, timeout, headers, cache_ttl)
+            self.cassette.record(method, path, data, body, info, time.time() - start)
+        self.result['vultr_api']['api_cassette']['calls'] = self.cassette.calls
+
+        if stream and body is not None and info['status'] < 400:
+            body = BytesIO(body)
+        return body, info
+
+    def _fetch(self, url, method="GET", data=None, stream=False, timeout=None, headers=None, cache_ttl=None):
+        if timeout is None:
+            timeout = self.api_config['api_timeout']
+        if headers is None:
+            headers = self.headers
+
+        if self.broker is not None:
+            body, info = self.broker.request(
+                url=url,
+                method=method,
+                data=data,
+                headers=headers,
+                timeout=timeout,
+                validate_certs=self.module.params.get('validate_certs'),
+                cache_ttl=cache_ttl,
+            )
+            if info is not None:
+                if stream and body is not None and info['status'] < 400:
+                    body = BytesIO(body)
+                return body, info
+            # The broker is gone, send the requests directly
+            self.broker = None
+
+        if self.use_connection_pool:
+            return self.connection_pool.request(
+                url=url,
+                data=data,
+                method=method,
+                headers=headers,
+                timeout=timeout,
+                stream=stream,
+            )
+
+        response, info = fetch_url(
+            module=self.module,
+            url=url,
+            data=data,
+            method=method,
+            headers=headers,
+            timeout=timeout,
+        )
+        if response is None:
+            return info.get('body'), info
+        if stream:
+            return response, info
+        return response.read(), info
+
+    def _get_disk_cached_list(self, resource, query_by='list', params=None, use_cache=False, refresh=False):
+        """Return the key of the list in the persistent cache and the list if cached."""
+        if not use_cache or params or resource not in VULTR_API_CACHE_TTLS or self.disk_cache is None:
+            return None, None
+
+        cache_key = "%s-%s" % (resource, query_by)
         r_list = None
+        if not refresh and self.api_config['api_cache_mode'] == 'enabled':
+            r_list = self.disk_cache.get(cache_key, VULTR_API_CACHE_TTLS[resource])
+        return cache_key, r_list
+
+    def _get_broker_cache_ttl(self, resource, cache_key, refresh=False):
+        """Return the cache_ttl of the broker for a list of the persistent cache, None for other lists."""
+        if cache_key is None:
+            return None
+        if refresh or self.api_config['api_cache_mode'] != 'enabled':
+            return 0
+        return VULTR_API_CACHE_TTLS[resource]
+
+    def _cache_resource_list(self, resource, r_list, from_disk_cache=False):
+        self.api_cache.update({
+            resource: r_list
+        })
+        self.api_cache_index.pop(resource, None)
+        if from_disk_cache:
+            self.api_cache_from_disk.add(resource)
+        else:
+            self.api_cache_from_disk.discard(resource)
+
+    def query_resource_list(self, resource='regions', query_by='list', params=None, use_cache=False, refresh=False):
+        """Return the list of a resource and whether it was served by the persistent cache."""
+        cache_key, r_list = self._get_disk_cached_list(resource, query_by, params, use_cache, refresh)
+
+        from_disk_cache = r_list is not None
+        if self.api_metrics is not None:
+            self.api_metrics['disk_cache_hits' if from_disk_cache else 'cache_misses'] += 1
+
+        if not from_disk_cache:
+            r_list = self.api_query(
+                path="/v1/%s/%s" % (resource, query_by),
+                data=params,
+                cache_ttl=self._get_broker_cache_ttl(resource, cache_key, refresh),
+            )
+            if cache_key and r_list:
+                self.disk_cache.set(cache_key, r_list)
+
         if use_cache:
-            r_list = self.api_cache.get(resource)
+            self._cache_resource_list(resource, r_list, from_disk_cache)
+        return r_list, from_disk_cache
 
-        if not r_list:
-            r_list = self.api_query(path="/v1/%s/%s" % (resource, query_by), data=params)
-            if use_cache:
-                self.api_cache.update({
-                    resource: r_list
-                })
+    def warm_api_cache(self, resources):
+        """Fetch the lists of several resources concurrently for query_resource_by_key(use_cache=True).
+
+        Resources are given as (resource, query_by) tuples, lists already cached are skipped.
+        """
+        pending = []
+        for resource, query_by in resources:
+            if self.api_cache.get(resource):
+                continue
+
+            cache_key, r_list = self._get_disk_cached_list(resource, query_by, use_cache=True)
+            if r_list is not None:
+                if self.api_metrics is not None:
+                    self.api_metrics['disk_cache_hits'] += 1
+                self._cache_resource_list(resource, r_list, from_disk_cache=True)
+            else:
+                pending.append((resource, query_by, cache_key))
+
+        if self.api_metrics is not None:
+            self.api_metrics['cache_misses'] += len(pending)
+
+        r_lists = self.api_query_many([
+            dict(path="/v1/%s/%s" % (resource, query_by), cache_ttl=self._get_broker_cache_ttl(resource, cache_key))
+            for resource, query_by, cache_key in pending
+        ])
+        for (resource, query_by, cache_key), r_list in zip(pending, r_lists):
+            if cache_key and r_list:
+                self.disk_cache.set(cache_key, r_list)
+            self._cache_resource_list(resource, r_list)
+
+    def _get_cache_index(self, resource, key, to_key):
+        indexes = self.api_cache_index.setdefault(resource, dict())
+        index = indexes.get((key, to_key))
+        if index is None:
+            r_list = self.api_cache.get(resource) or []
+            if isinstance(r_list, dict):
+                r_list = r_list.values()
+
+            # Remember the position to resolve matches by key and ID key in list order
+            index = dict()
+            for position, r_data in enumerate(r_list):
+                index.setdefault(to_key(r_data[key]), (position, r_data))
+            indexes[(key, to_key)] = index
+        return index
+
+    def find_cached_resource(self, resource, key, value, id_key=None):
+        matches = [self._get_cache_index(resource, key, str).get(str(value))]
+        if id_key is not None:
+            matches.append(self._get_cache_index(resource, id_key, to_text).get(to_text(value)))
 
+        matches = [match for match in matches if match is not None]
+        if not matches:
+            return None
+        return min(matches, key=lambda match: match[0])[1]
+
+    @staticmethod
+    def find_resource(r_list, key, value, id_key=None):
         if not r_list:
-            return {}
+            return None
 
         elif isinstance(r_list, list):
             for r_data in r_list:
@@ -249,6 +2320,39 @@ class Vultr:
                     return r_data
                 if id_key is not None and to_text(r_data[id_key]) == to_text(value):
                     return r_data
+        return None
+
+    def query_resource_by_key(self, key, value, resource='regions', query_by='list', params=None, use_cache=False, id_key=None, optional=False):
+        if not value:
+            return {}
+
+        r_list = None
+        from_disk_cache = False
+        if use_cache:
+            r_list = self.api_cache.get(resource)
+            from_disk_cache = resource in self.api_cache_from_disk
+            if r_list and self.api_metrics is not None:
+                self.api_metrics['cache_hits'] += 1
+
+        if not r_list:
+            r_list, from_disk_cache = self.query_resource_list(resource, query_by, params, use_cache)
+
+        if use_cache:
+            r_data = self.find_cached_resource(resource, key, value, id_key)
+        else:
+            r_data = self.find_resource(r_list, key, value, id_key)
+
+        # The persistent cache may be outdated, e.g. by a firewall group created meanwhile
+        if r_data is None and from_disk_cache:
+            r_list, from_disk_cache = self.query_resource_list(resource, query_by, params, use_cache, refresh=True)
+            r_data = self.find_cached_resource(resource, key, value, id_key)
+
+        if not r_list:
+            return {}
+
+        if r_data is not None:
+            return r_data
+
         if not optional:
             if id_key:
                 msg = "Could not find %s with ID or %s: %s" % (resource, key, value)
@@ -259,36 +2363,29 @@ class Vultr:
 
     @staticmethod
     def normalize_result(resource, schema, remove_missing_keys=True):
-        if remove_missing_keys:
-            fields_to_remove = set(resource.keys()) - set(schema.keys())
-            for field in fields_to_remove:
-                resource.pop(field)
+        if not isinstance(schema, VultrSchema):
+            schema = VultrSchema(schema)
+        return schema.normalize(resource, remove_missing_keys=remove_missing_keys)
 
-        for search_key, config in schema.items():
-            if search_key in resource:
-                if 'convert_to' in config:
-                    if config['convert_to'] == 'int':
-                        resource[search_key] = int(resource[search_key])
-                    elif config['convert_to'] == 'float':
-                        resource[search_key] = float(resource[search_key])
-                    elif config['convert_to'] == 'bool':
-                        resource[search_key] = True if resource[search_key] == 'yes' else False
-
-                if 'transform' in config:
-                    resource[search_key] = config['transform'](resource[search_key])
-
-                if 'key' in config:
-                    resource[config['key']] = resource[search_key]
-                    del resource[search_key]
+    def get_result(self, resource):
+        with self.trace('normalize', cat='normalize', resource=self.namespace) as span:
+            if isinstance(resource, types.GeneratorType):
+                # Normalize streamed items as they arrive
+                returns = VultrSchema(self.returns)
+                resource = [returns.normalize(item) for item in resource]
+                if resource:
+                    self.result[self.namespace] = resource
 
-        return resource
+            elif resource:
+                returns = VultrSchema(self.returns)
+                if isinstance(resource, list):
+                    self.result[self.namespace] = [returns.normalize(item) for item in resource]
+                else:
+                    self.result[self.namespace] = returns.normalize(resource)
 
-    def get_result(self, resource):
-        if resource:
-            if isinstance(resource, list):
-                self.result[self.namespace] = [Vultr.normalize_result(item, self.returns) for item in resource]
-            else:
-                self.result[self.namespace] = Vultr.normalize_result(resource, self.returns)
+            if self.tracer is not None:
+                result = self.result[self.namespace]
+                span.set(items=len(result) if isinstance(result, list) else int(bool(result)))
 
         return self.result
 
@@ -63,6 +63,94 @@ vultr_api:
       returned: success
       type: str
       sample: "https://api.vultr.com"
+    api_connections:
+      description: Statistics about the keep-alive HTTP connections used for the API requests and the bytes received, compressed and decompressed.
+      returned: success
+      type: dict
+      sample: {"requests": 12, "connections_opened": 1, "connections_reused": 11, "bytes_received": 2816, "bytes_decoded": 23552}
+    api_retry_status_codes:
+      description: HTTP status codes of the API responses which are retried
+      returned: success
+      type: list
+      sample: [429, 500, 502, 503, 504]
+    api_rate_limit:
+      description: Max. amount of API requests per second shared by all forks, 0 if disabled
+      returned: success
+      type: float
+      sample: 2.0
+    api_cache_mode:
+      description: Use of the persistent cache for catalog lists
+      returned: success
+      type: str
+      sample: enabled
+    api_metrics:
+      description: Telemetry of the API requests
+      returned: success and I(api_metrics=true)
+      type: dict
+      sample: {
+        "requests": {"GET /v1/server/list": {"count": 3, "time": 0.92, "max_time": 0.41}},
+        "retries": 0,
+        "backoff_time": 0.0,
+        "rate_limit_time": 0.0,
+        "wait_time": 5.0,
+        "cache_hits": 2,
+        "disk_cache_hits": 1,
+        "cache_misses": 1,
+        "coalesced": 0,
+        "not_modified": 0
+      }
+    api_deadline:
+      description: Max. time in seconds an API call may take including retries, 0 if unbounded
+      returned: success
+      type: int
+      sample: 30
+    api_time_budget:
+      description: Max. time in seconds all API calls of the task may take, 0 if unbounded
+      returned: success
+      type: int
+      sample: 120
+    api_circuit_threshold:
+      description: Amount of consecutive failures of all forks after which API requests fail fast, 0 if disabled
+      returned: success
+      type: int
+      sample: 10
+    api_circuit_cooldown:
+      description: Time in seconds API requests fail fast once the circuit breaker opened
+      returned: success
+      type: int
+      sample: 30
+    api_circuit_breaker:
+      description: State of the circuit breaker shared by all forks and its transitions during the task
+      returned: success when the circuit breaker is enabled
+      type: dict
+      sample: {
+        "state": "closed",
+        "transitions": [{"from": "half_open", "to": "closed", "time": 1601234567.89}]
+      }
+    api_broker:
+      description: Whether the API requests were sent through the broker process shared by all tasks
+      returned: success
+      type: bool
+      sample: false
+    api_cassette:
+      description: Cassette the API requests were recorded to or replayed from and the amount of requests
+      returned: success when the ENV variable C(VULTR_API_CASSETTE) is set
+      type: dict
+      sample: {
+        "path": "tests/cassettes/vultr_server_present.jsonl",
+        "mode": "replay",
+        "calls": 7
+      }
+    api_trace:
+      description: Trace file the spans of the API requests were appended to, as JSON lines of Chrome trace events
+      returned: success when the ENV variable C(VULTR_API_TRACE) is set
+      type: str
+      sample: /tmp/vultr-trace.jsonl
+    api_profile:
+      description: Profile of the module run written at exit, with a summary in a .txt file next to it
+      returned: success when the ENV variable C(VULTR_API_PROFILE) is set
+      type: str
+      sample: /tmp/vultr-profiles/vultr_server_info-20201001T120000-4242.prof
 vultr_account_info:
   description: Response from Vultr API
   returned: success
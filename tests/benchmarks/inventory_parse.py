@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Microbenchmark of adding normalized servers as hosts to the inventory.
+
+Times InventoryModule._populate() next to the former per host loop, without and
+with the constructed options of the inventory examples, and checks both build
+the same inventory. Most of the constructed time is spent by ansible-core
+compiling the Jinja expressions for every host.
+
+Run from a checkout installed into an ansible_collections tree:
+
+  python tests/benchmarks/inventory_parse.py [records]
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import copy
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.inventory import BaseInventoryPlugin
+from ansible.plugins.loader import inventory_loader
+
+from ansible_collections.ngine_io.vultr.plugins.inventory.vultr import SCHEMA
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import VultrSchema
+
+from normalize_result import get_server
+
+
+REGIONS = ('Amsterdam', 'Frankfurt', 'New Jersey', 'Tokyo')
+OSES = ('CentOS 7 x64', 'Debian 10 x64 (buster)', 'Ubuntu 20.04 x64')
+POWER_STATUSES = ('running', 'running', 'stopped')
+
+
+CONFIGS = {
+    'plain': '''
+plugin: vultr
+''',
+    'constructed': '''
+plugin: vultr
+compose:
+  ansible_user: "'root'"
+groups:
+  running: power_status == 'running'
+keyed_groups:
+  - prefix: vultr_region
+    key: region | lower
+  - separator: ""
+    key: os
+''',
+}
+
+
+def legacy_populate(plugin, servers, hostname_preference='v4_main_ip'):
+    """The per host loop used before _populate()."""
+    for server in servers:
+        plugin.inventory.add_host(host=server['name'], group='vultr')
+
+        for attribute, value in server.items():
+            plugin.inventory.set_variable(server['name'], attribute, value)
+
+        if hostname_preference != 'name':
+            plugin.inventory.set_variable(server['name'], 'ansible_host', server[hostname_preference])
+
+        strict = plugin.get_option('strict')
+        plugin._set_composite_vars(plugin.get_option('compose'), server, server['name'], strict=strict)
+        plugin._add_host_to_composed_groups(plugin.get_option('groups'), server, server['name'], strict=strict)
+        plugin._add_host_to_keyed_groups(plugin.get_option('keyed_groups'), server, server['name'], strict=strict)
+
+
+def get_plugin(loader, config_path):
+    plugin = inventory_loader.get('ngine_io.vultr.vultr')
+    BaseInventoryPlugin.parse(plugin, InventoryData(), loader, config_path)
+    try:
+        # Only templates of trusted strings are rendered since ansible-core 2.19
+        config = loader.load_from_file(config_path, cache='none', trusted_as_template=True)
+    except TypeError:
+        config = loader.load_from_file(config_path, cache='none')
+    plugin.set_options(direct=config)
+    return plugin
+
+
+def get_hosts(inventory):
+    """Return the groups and vars of every host to compare the inventories."""
+    return dict(
+        (name, (sorted(group.name for group in host.get_groups()), host.get_vars()))
+        for name, host in inventory.hosts.items()
+    )
+
+
+def measure(populate, loader, config_path, servers, repeat=3):
+    timings = []
+    for run in range(repeat):
+        plugin = get_plugin(loader, config_path)
+        plugin.inventory.add_group('vultr')
+        records = copy.deepcopy(servers)
+        start = timeit.default_timer()
+        populate(plugin, records)
+        timings.append(timeit.default_timer() - start)
+    return min(timings), plugin.inventory
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    schema = VultrSchema(SCHEMA)
+    servers = []
+    for subid in range(records):
+        server = schema.normalize(get_server(subid))
+        server['region'] = REGIONS[subid % len(REGIONS)]
+        server['os'] = OSES[subid % len(OSES)]
+        server['power_status'] = POWER_STATUSES[subid % len(POWER_STATUSES)]
+        servers.append(server)
+
+    def populate(plugin, records):
+        plugin._populate([({'account': {'name': 'default'}, 'instance_type': 'cloud'}, records)], 'v4_main_ip')
+
+    loader = DataLoader()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for name, config in sorted(CONFIGS.items()):
+            config_path = os.path.join(tmp_dir, '%s.vultr.yml' % name)
+            with open(config_path, 'w') as f:
+                f.write(config)
+
+            legacy, legacy_inventory = measure(legacy_populate, loader, config_path, servers)
+            current, inventory = measure(populate, loader, config_path, servers)
+
+            if get_hosts(legacy_inventory) != get_hosts(inventory):
+                raise SystemExit("%s: the inventories differ" % name)
+
+            print("%s records, %s: former loop %.1f ms, _populate %.1f ms" % (
+                records, name, legacy * 1000, current * 1000))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Microbenchmark of normalizing server records with the inventory SCHEMA.
+
+Run from a checkout installed into an ansible_collections tree:
+
+  python tests/benchmarks/normalize_result.py [records]
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import copy
+import sys
+import timeit
+
+from ansible_collections.ngine_io.vultr.plugins.inventory.vultr import SCHEMA
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import VultrSchema
+
+
+def legacy_normalize_result(resource, schema, remove_missing_keys=True):
+    """The per record schema walk used before schemas were compiled."""
+    if remove_missing_keys:
+        fields_to_remove = set(resource.keys()) - set(schema.keys())
+        for field in fields_to_remove:
+            resource.pop(field)
+
+    for search_key, config in schema.items():
+        if search_key in resource:
+            if 'convert_to' in config:
+                if config['convert_to'] == 'int':
+                    resource[search_key] = int(resource[search_key])
+                elif config['convert_to'] == 'float':
+                    resource[search_key] = float(resource[search_key])
+                elif config['convert_to'] == 'bool':
+                    resource[search_key] = True if resource[search_key] == 'yes' else False
+
+            if 'transform' in config:
+                resource[search_key] = config['transform'](resource[search_key])
+
+            if 'key' in config:
+                resource[config['key']] = resource[search_key]
+                del resource[search_key]
+
+    return resource
+
+
+def get_server(subid):
+    return {
+        'SUBID': str(subid),
+        'os': 'CentOS 7 x64',
+        'ram': '1024 MB',
+        'disk': 'Virtual 25 GB',
+        'main_ip': '10.0.%s.%s' % (subid // 256 % 256, subid % 256),
+        'vcpu_count': '1',
+        'location': 'Amsterdam',
+        'DCID': '7',
+        'default_password': 'secret',
+        'date_created': '2020-01-01 00:00:00',
+        'pending_charges': '0.01',
+        'status': 'active',
+        'cost_per_month': '5.00',
+        'current_bandwidth_gb': 0,
+        'allowed_bandwidth_gb': '1000',
+        'netmask_v4': '255.255.254.0',
+        'gateway_v4': '10.0.0.1',
+        'power_status': 'running',
+        'server_state': 'ok',
+        'VPSPLANID': '201',
+        'v6_main_ip': '',
+        'v6_network_size': '',
+        'v6_network': '',
+        'v6_networks': [],
+        'label': 'server-%s' % subid,
+        'internal_ip': '',
+        'kvm_url': 'https://my.vultr.com/subs/vps/novnc/api.php?data=abc',
+        'auto_backups': 'no',
+        'tag': 'bench',
+        'OSID': '167',
+        'APPID': '0',
+        'FIREWALLGROUPID': '0',
+    }
+
+
+def measure(normalize, servers, repeat=5):
+    timings = []
+    for run in range(repeat):
+        records = copy.deepcopy(servers)
+        start = timeit.default_timer()
+        normalize(records)
+        timings.append(timeit.default_timer() - start)
+    return min(timings)
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    servers = [get_server(subid) for subid in range(records)]
+
+    def run_legacy(records):
+        for server in records:
+            legacy_normalize_result(server, SCHEMA)
+
+    def run_compiled(records):
+        schema = VultrSchema(SCHEMA)
+        for server in records:
+            schema.normalize(server)
+
+    legacy = measure(run_legacy, servers)
+    compiled = measure(run_compiled, servers)
+
+    print("%s records: legacy %.1f ms, compiled %.1f ms, speedup %.1fx" % (
+        records, legacy * 1000, compiled * 1000, legacy / compiled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os
+import threading
+
+import pytest
+
+from ansible.module_utils import basic
+from ansible.module_utils._text import to_bytes
+from ansible.module_utils.six.moves import BaseHTTPServer, socketserver
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import (
+    Vultr,
+    vultr_argument_spec,
+)
+from ansible_collections.ngine_io.vultr.tests.utils.vultr_api_server import VultrAPIServer
+
+
+class LocalHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    # Keep-alive connections of the clients under test stay open
+    daemon_threads = True
+
+
+@pytest.fixture
+def serve():
+    """Return a function serving an HTTP server on a thread until the end of the test, it sets the url of the server."""
+    servers = []
+
+    def serve(server):
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        server.url = 'http://127.0.0.1:%s' % server.server_address[1]
+        servers.append(server)
+        return server
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def http_server(serve):
+    """Return a function serving a request handler class on a free local port, for responses the stand-in does not give."""
+    def http_server(handler):
+        server = LocalHTTPServer(('127.0.0.1', 0), handler)
+        server.requests = []
+        return serve(server)
+
+    return http_server
+
+
+@pytest.fixture
+def make_api(serve):
+    """Return a factory of Vultr API stand-ins of tests/utils/vultr_api_server.py, see VultrAPIServer for the arguments."""
+    def make_api(servers=0, baremetals=0, **kwargs):
+        server = VultrAPIServer(('127.0.0.1', 0), **kwargs)
+        server.add_servers(servers)
+        server.add_baremetals(baremetals)
+        return serve(server)
+
+    return make_api
+
+
+@pytest.fixture
+def api(make_api):
+    return make_api()
+
+
+@pytest.fixture
+def vultr_env(tmp_path, monkeypatch):
+    """Isolate the tests from the Vultr settings of the environment and the ini files."""
+    for name in list(os.environ):
+        if name.startswith('VULTR_'):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    monkeypatch.setenv('VULTR_API_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.chdir(str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def set_module_args(vultr_env, monkeypatch):
+    """Return a function passing the args to the next module created."""
+    def set_module_args(args):
+        args = dict(args)
+        args.setdefault('api_key', 'secret')
+        monkeypatch.setattr(basic, '_ANSIBLE_ARGS', to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': args})))
+        if hasattr(basic, '_ANSIBLE_PROFILE'):
+            monkeypatch.setattr(basic, '_ANSIBLE_PROFILE', 'legacy')
+
+    return set_module_args
+
+
+@pytest.fixture
+def make_vultr(set_module_args):
+    """Return a factory of Vultr instances of a module run with the given args."""
+    def make_vultr(namespace='vultr_test', **args):
+        set_module_args(args)
+        module = basic.AnsibleModule(argument_spec=vultr_argument_spec(), supports_check_mode=True)
+        return Vultr(module, namespace)
+
+    return make_vultr
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+
+import pytest
+
+from ansible.errors import AnsibleError
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.inventory import BaseInventoryPlugin
+from ansible.plugins.loader import inventory_loader
+
+from ansible_collections.ngine_io.vultr.plugins.inventory.vultr import INSTANCE_TYPES, InventoryModule, _load_conf
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import VULTR_API_ENDPOINT
+
+
+@pytest.fixture
+def write_config(vultr_env):
+    """Return a function writing an inventory config with the given options, returning its path."""
+    def write_config(**options):
+        config = dict(plugin='vultr', api_key='secret')
+        config.update(options)
+        path = str(vultr_env / 'test.vultr.yml')
+        with open(path, 'w') as f:
+            # JSON is valid YAML
+            f.write(json.dumps(config))
+        return path
+
+    return write_config
+
+
+def get_plugin():
+    plugin = inventory_loader.get('ngine_io.vultr.vultr')
+    # Configs name the plugin vultr, ansible-core records the redirect to the collection
+    plugin._redirected_names = ['vultr', 'ngine_io.vultr.vultr']
+    return plugin
+
+
+def load_plugin(config_path):
+    """Return the plugin with the options of the config read, without parsing the inventory."""
+    plugin = get_plugin()
+    BaseInventoryPlugin.parse(plugin, InventoryData(), DataLoader(), config_path)
+    plugin._read_config_data(config_path)
+    return plugin
+
+
+def parse(config_path, cache=True):
+    """Parse the inventory like ansible-inventory, cache=False is --flush-cache."""
+    plugin = get_plugin()
+    inventory = InventoryData()
+    plugin.parse(inventory, DataLoader(), config_path, cache=cache)
+    if plugin.get_option('cache'):
+        plugin.update_cache_if_changed()
+    return inventory
+
+
+def get_groups(inventory, host_name):
+    return sorted(group.name for group in inventory.get_host(host_name).get_groups())
+
+
+def server_list_requests(api):
+    return api.stats['requests'].get('/v1/server/list', 0)
+
+
+@pytest.fixture
+def cached_config(write_config, vultr_env, api):
+    return write_config(
+        api_endpoint=api.url,
+        hostname='name',
+        cache=True,
+        cache_plugin='jsonfile',
+        cache_connection=str(vultr_env / 'inventory_cache'),
+    )
+
+
+def test_servers_are_served_by_the_cache(cached_config, api):
+    api.add_servers(2)
+    assert sorted(parse(cached_config).hosts) == ['stand-in-0', 'stand-in-1']
+    assert server_list_requests(api) == 1
+
+    assert sorted(parse(cached_config).hosts) == ['stand-in-0', 'stand-in-1']
+    assert server_list_requests(api) == 1
+
+
+def test_flush_cache_fetches_the_servers(cached_config, api):
+    api.add_servers(1)
+    parse(cached_config)
+    api.add_servers(2)
+    assert sorted(parse(cached_config, cache=False).hosts) == ['stand-in-0', 'stand-in-1']
+    assert server_list_requests(api) == 2
+
+    # The refreshed servers are cached
+    assert sorted(parse(cached_config).hosts) == ['stand-in-0', 'stand-in-1']
+    assert server_list_requests(api) == 2
+
+
+def test_cached_servers_are_not_changed_by_the_accounts(write_config, vultr_env, api):
+    api.add_servers(1)
+    config = write_config(
+        api_endpoint=api.url,
+        hostname='name',
+        api_accounts=[dict(name='ops', api_key='secret')],
+        cache=True,
+        cache_plugin='jsonfile',
+        cache_connection=str(vultr_env / 'inventory_cache'),
+    )
+    parse(config)
+    inventory = parse(config)
+    assert server_list_requests(api) == 1
+    assert inventory.get_host('stand-in-0').get_vars()['vultr_account'] == 'ops'
+
+    plugin = load_plugin(config)
+    cache_key = plugin._get_servers_cache_key(dict(account=plugin._get_accounts({})[0], instance_type='cloud'), None)
+    cached = plugin._cache[cache_key]
+    assert 'vultr_account' not in cached[0]
+
+
+@pytest.mark.parametrize('change', [
+    dict(name='ops'),
+    dict(api_key='other'),
+    dict(api_endpoint='https://api.example.com'),
+])
+def test_cache_key_by_account(write_config, change):
+    plugin = load_plugin(write_config())
+    account = dict(name='default', api_key='secret', api_endpoint='https://api.vultr.com')
+    source = dict(account=account, instance_type='cloud')
+    other_source = dict(account=dict(account, **change), instance_type='cloud')
+    assert plugin._get_servers_cache_key(source, None) != plugin._get_servers_cache_key(other_source, None)
+
+
+def test_cache_key_by_instance_type_tag_and_api_version(write_config):
+    account = dict(name='default', api_key='secret', api_endpoint='https://api.vultr.com')
+    cloud = dict(account=account, instance_type='cloud')
+    baremetal = dict(account=account, instance_type='baremetal')
+
+    plugin = load_plugin(write_config())
+    keys = set([
+        plugin._get_servers_cache_key(cloud, None),
+        plugin._get_servers_cache_key(baremetal, None),
+        plugin._get_servers_cache_key(cloud, 'web'),
+        load_plugin(write_config(api_version='v2'))._get_servers_cache_key(cloud, None),
+    ])
+    assert len(keys) == 4
+    assert not any('secret' in key for key in keys)
+
+
+@pytest.fixture
+def write_ini(vultr_env):
+    """Return a function writing a Vultr configuration file with the given sections, returning its path."""
+    def write_ini(**sections):
+        path = str(vultr_env / 'test.vultr.ini')
+        with open(path, 'w') as f:
+            for section, settings in sections.items():
+                f.write('[%s]\n' % section)
+                for key, value in settings.items():
+                    f.write('%s = %s\n' % (key, value))
+        return path
+
+    return write_ini
+
+
+def get_accounts(config_path):
+    plugin = load_plugin(config_path)
+    return dict((account['name'], account) for account in plugin._get_accounts(_load_conf(plugin.get_option('api_config'))))
+
+
+def test_missing_api_key_fails(write_config):
+    with pytest.raises(AnsibleError, match='Could not find an API key'):
+        get_accounts(write_config(api_key=None))
+
+
+def test_account_of_the_ini(write_config, write_ini):
+    ini = write_ini(ops=dict(key='ops-secret', endpoint='https://ops.example.com'))
+    accounts = get_accounts(write_config(api_key=None, api_account='ops', api_config=ini))
+    assert accounts['ops']['api_key'] == 'ops-secret'
+    assert accounts['ops']['api_endpoint'] == 'https://ops.example.com'
+
+
+def test_api_accounts_by_name_or_dict(write_config, write_ini):
+    ini = write_ini(
+        production=dict(key='production-secret', endpoint='https://production.example.com'),
+        staging=dict(key='staging-secret'),
+        lab=dict(key='lab-ini-secret', endpoint='https://lab-ini.example.com'),
+    )
+    accounts = get_accounts(write_config(
+        api_config=ini,
+        api_endpoint='https://option.example.com',
+        api_accounts=['production', 'staging', dict(name='lab', api_key='lab-secret', api_endpoint='https://lab.example.com')],
+    ))
+    assert [(name, accounts[name]['api_key'], accounts[name]['api_endpoint']) for name in sorted(accounts)] == [
+        ('lab', 'lab-secret', 'https://lab.example.com'),
+        ('production', 'production-secret', 'https://production.example.com'),
+        ('staging', 'staging-secret', 'https://option.example.com'),
+    ]
+
+
+def test_api_accounts_endpoint_defaults_to_the_vultr_api(write_config):
+    accounts = get_accounts(write_config(api_accounts=[dict(name='lab', api_key='lab-secret')]))
+    assert accounts['lab']['api_endpoint'] == VULTR_API_ENDPOINT
+
+
+def test_api_accounts_entry_without_name_fails(write_config):
+    with pytest.raises(AnsibleError, match='needs a name'):
+        get_accounts(write_config(api_accounts=[dict(api_key='lab-secret')]))
+
+
+def test_api_accounts_entry_without_api_key_fails(write_config, write_ini):
+    ini = write_ini(production=dict(key='production-secret'))
+    with pytest.raises(AnsibleError, match='for the account staging'):
+        get_accounts(write_config(api_config=ini, api_accounts=['production', 'staging']))
+
+
+def test_error_of_a_source_is_raised_after_the_previous_sources():
+    def fetch_servers(source):
+        if source == 'baremetal':
+            raise AnsibleError('baremetal failed')
+        return [source]
+
+    sources_servers = InventoryModule._retrieve_sources_servers(['cloud', 'baremetal', 'other'], fetch_servers)
+    assert next(sources_servers) == ('cloud', ['cloud'])
+    with pytest.raises(AnsibleError, match='baremetal failed'):
+        next(sources_servers)
+
+
+def test_servers_of_a_single_source_are_streamed():
+    servers = iter([dict(id='1')])
+    assert list(InventoryModule._retrieve_sources_servers(['cloud'], lambda source: servers)) == [('cloud', servers)]
+
+
+def test_api_error_of_concurrent_sources_fails(write_config, make_api):
+    api = make_api(servers=1, baremetals=1, error_rate=1)
+    config = write_config(api_endpoint=api.url, api_retries=1, instance_types=['cloud', 'baremetal'])
+    with pytest.raises(AnsibleError, match='Error while fetching'):
+        parse(config)
+
+
+def test_instance_types_of_the_api_versions():
+    assert sorted(INSTANCE_TYPES['v1']) == sorted(INSTANCE_TYPES['v2']) == ['baremetal', 'cloud']
+
+
+def test_cloud_hosts_are_not_grouped_by_instance_type(write_config, make_api):
+    api = make_api(servers=1)
+    inventory = parse(write_config(api_endpoint=api.url))
+    assert get_groups(inventory, 'stand-in-0') == ['vultr']
+    assert 'vultr_instance_type' not in inventory.get_host('stand-in-0').vars
+
+
+@pytest.mark.parametrize('api_version', ['v1', 'v2'])
+def test_hosts_are_grouped_by_instance_type(write_config, make_api, api_version):
+    api = make_api(servers=1, baremetals=1)
+    inventory = parse(write_config(api_endpoint=api.url, api_version=api_version, instance_types=['cloud', 'baremetal']))
+
+    cloud = inventory.get_host('stand-in-0').vars
+    assert get_groups(inventory, 'stand-in-0') == ['vultr', 'vultr_cloud']
+    assert cloud['vultr_instance_type'] == 'cloud'
+    assert cloud['vcpu_count'] == 1
+
+    baremetal = inventory.get_host('stand-in-metal-0').vars
+    assert get_groups(inventory, 'stand-in-metal-0') == ['vultr', 'vultr_baremetal']
+    assert baremetal['vultr_instance_type'] == 'baremetal'
+    assert baremetal['cpu_count'] == 12
+    assert 'vcpu_count' not in baremetal
+
+
+def test_hosts_are_grouped_by_account(write_config, make_api):
+    production = make_api(servers=1)
+    staging = make_api(servers=2)
+    inventory = parse(write_config(hostname='name', api_accounts=[
+        dict(name='production', api_key='secret', api_endpoint=production.url),
+        dict(name='staging', api_key='secret', api_endpoint=staging.url),
+    ]))
+    assert get_groups(inventory, 'stand-in-1') == ['vultr', 'vultr_account_staging']
+    assert inventory.get_host('stand-in-1').vars['vultr_account'] == 'staging'
+
+    # Hosts of the same name are merged
+    assert get_groups(inventory, 'stand-in-0') == ['vultr', 'vultr_account_production', 'vultr_account_staging']
+
+
+@pytest.mark.parametrize('hostname, ansible_host', [
+    ('v4_main_ip', '192.0.66.65'),
+    ('name', None),
+])
+def test_hostname_sets_the_ansible_host(write_config, make_api, hostname, ansible_host):
+    api = make_api(servers=1)
+    inventory = parse(write_config(api_endpoint=api.url, hostname=hostname))
+    assert inventory.get_host('stand-in-0').vars.get('ansible_host') == ansible_host
+
+
+def test_constructed_options(write_config, make_api):
+    api = make_api(servers=1, baremetals=1)
+    inventory = parse(write_config(
+        api_endpoint=api.url,
+        instance_types=['cloud', 'baremetal'],
+        compose=dict(region_name='region | lower'),
+        groups=dict(metal="vultr_instance_type == 'baremetal'"),
+        keyed_groups=[dict(prefix='os', key='os')],
+    ))
+    assert inventory.get_host('stand-in-0').vars['region_name'] == 'new jersey'
+    assert get_groups(inventory, 'stand-in-0') == ['os_CentOS_7_x64', 'vultr', 'vultr_cloud']
+    assert get_groups(inventory, 'stand-in-metal-0') == ['metal', 'os_CentOS_7_x64', 'vultr', 'vultr_baremetal']
+
+
+def test_api_settings_defaults(write_config):
+    accounts = get_accounts(write_config())
+    assert (accounts['default']['api_timeout'], accounts['default']['api_retries'], accounts['default']['api_retry_max_delay']) == (60, 5, 12)
+
+
+def test_api_settings_of_the_ini(write_config, write_ini):
+    ini = write_ini(default=dict(key='secret', timeout=30, retries=3, retry_max_delay=6))
+    accounts = get_accounts(write_config(api_key=None, api_config=ini))
+    assert (accounts['default']['api_timeout'], accounts['default']['api_retries'], accounts['default']['api_retry_max_delay']) == (30, 3, 6)
+
+
+def test_api_settings_options_take_precedence_over_the_ini(write_config, write_ini):
+    ini = write_ini(
+        production=dict(key='secret', timeout=30, retries=3, retry_max_delay=6),
+        staging=dict(key='secret', retries=2),
+    )
+    accounts = get_accounts(write_config(api_config=ini, api_timeout=10, api_retry_max_delay=4, api_accounts=['production', 'staging']))
+    assert (accounts['production']['api_timeout'], accounts['production']['api_retries'], accounts['production']['api_retry_max_delay']) == (10, 3, 4)
+    assert (accounts['staging']['api_timeout'], accounts['staging']['api_retries'], accounts['staging']['api_retry_max_delay']) == (10, 2, 4)
+
+
+def test_invalid_api_setting_of_the_ini_fails(write_config, write_ini):
+    ini = write_ini(staging=dict(key='secret', timeout='soon'))
+    with pytest.raises(AnsibleError, match="in section 'staging'"):
+        get_accounts(write_config(api_config=ini, api_accounts=['staging']))
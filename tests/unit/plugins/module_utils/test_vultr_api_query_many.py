@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.tests.utils.vultr_api_server import APPS, OSES, PLANS, REGIONS
+
+
+QUERIES = [
+    dict(path='/v1/regions/list'),
+    dict(path='/v1/plans/list'),
+    dict(path='/v1/os/list'),
+    dict(path='/v1/app/list'),
+]
+
+
+def fail_on(vultr, monkeypatch, failing_path, func):
+    request = vultr._request
+
+    def _request(path="/", **kwargs):
+        if path == failing_path:
+            func()
+        return request(path=path, **kwargs)
+
+    monkeypatch.setattr(vultr, '_request', _request)
+
+
+def test_results_are_in_the_order_of_the_queries(make_api, make_vultr):
+    # The first queries are answered last
+    api = make_api(latencies={'/v1/regions/list': 0.3, '/v1/plans/list': 0.2})
+    results = make_vultr(api_endpoint=api.url).api_query_many(QUERIES, max_workers=4)
+    assert results == [REGIONS, PLANS, OSES, APPS]
+
+
+def test_api_error_fails_the_module(api, make_vultr, capsys):
+    vultr = make_vultr(api_endpoint=api.url)
+    with pytest.raises(SystemExit):
+        vultr.api_query_many(QUERIES[:2] + [dict(path='/v1/missing/list')])
+    result = json.loads(capsys.readouterr().out)
+    assert result['failed']
+    assert '/v1/missing/list' in result['msg']
+
+
+def test_exception_of_a_worker_is_raised_by_the_caller(api, make_vultr, monkeypatch):
+    vultr = make_vultr(api_endpoint=api.url)
+
+    def fail():
+        raise RuntimeError("worker failed")
+
+    fail_on(vultr, monkeypatch, '/v1/plans/list', fail)
+    with pytest.raises(RuntimeError, match="worker failed"):
+        vultr.api_query_many(QUERIES)
+
+
+def test_module_failure_of_a_worker_is_not_cached(api, make_vultr, monkeypatch, capsys):
+    vultr = make_vultr(api_endpoint=api.url)
+
+    # Like fetch_url() failing the module on a proxy error
+    fail_on(vultr, monkeypatch, '/v1/plans/list', lambda: vultr.module.fail_json(msg="proxy error"))
+    with pytest.raises(SystemExit):
+        vultr.warm_api_cache([('regions', 'list'), ('plans', 'list')])
+    assert json.loads(capsys.readouterr().out)['msg'] == "proxy error"
+    assert 'plans' not in vultr.api_cache
+
+    del vultr._request
+    assert vultr.query_resource_list('plans', use_cache=True) == (PLANS, False)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils import vultr
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import (
+    VultrBroker,
+    VultrBrokerClient,
+    get_state_dir,
+)
+from ansible_collections.ngine_io.vultr.tests.utils.vultr_api_server import REGIONS
+
+
+@pytest.fixture
+def broker(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    client = VultrBrokerClient(VultrBrokerClient.get_socket_path())
+    thread = threading.Thread(target=VultrBroker(client.socket_path, idle_timeout=1).serve)
+    thread.daemon = True
+    thread.start()
+    for i in range(100):
+        if client.is_running():
+            break
+        time.sleep(0.01)
+    yield client
+    thread.join()
+
+
+def test_socket_is_in_the_private_state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    socket_dir = os.path.dirname(VultrBrokerClient.get_socket_path())
+    assert socket_dir == get_state_dir()
+    assert stat.S_IMODE(os.lstat(socket_dir).st_mode) == 0o700
+
+
+def test_request_through_the_broker(broker, api):
+    body, info = broker.request(api.url + '/v1/regions/list', 'GET', None, {'API-Key': 'secret'}, timeout=5)
+    assert info['status'] == 200
+    assert json.loads(body.decode()) == REGIONS
+
+
+def test_broker_of_another_user_is_refused(broker, api, monkeypatch):
+    uid = os.getuid()
+    monkeypatch.setattr(vultr.os, 'getuid', lambda: uid + 1)
+    assert not broker.is_running()
+    assert broker.request(api.url + '/v1/regions/list', 'GET', None, {'API-Key': 'secret'}, timeout=5) == (None, None)
+
+
+def regions_requests(api):
+    return api.stats['requests'].get('/v1/regions/list', 0)
+
+
+def test_only_requests_with_cache_ttl_are_cached(tmp_path, api):
+    broker = VultrBroker(str(tmp_path / 'broker.sock'))
+    for i in range(2):
+        broker.request(api.url + '/v1/regions/list', 'GET', None, {'API-Key': 'secret'}, timeout=5)
+    assert regions_requests(api) == 2
+
+    for i in range(2):
+        body, info = broker.request(api.url + '/v1/regions/list', 'GET', None, {'API-Key': 'secret'}, timeout=5, cache_ttl=3600)
+        assert json.loads(body.decode()) == REGIONS
+    assert regions_requests(api) == 3
+
+    # Refreshed
+    broker.request(api.url + '/v1/regions/list', 'GET', None, {'API-Key': 'secret'}, timeout=5, cache_ttl=0)
+    assert regions_requests(api) == 4
+
+
+def test_refresh_of_an_outdated_list_bypasses_the_broker_cache(tmp_path, api, make_vultr):
+    broker = VultrBroker(str(tmp_path / 'broker.sock'))
+    vultr = make_vultr(api_endpoint=api.url)
+    vultr.broker = broker
+    api.api.dispatch('POST', '/v1/firewall/group_create', {}, {'description': 'db'})
+    r_list, from_disk_cache = vultr.query_resource_list('firewall', 'group_list', use_cache=True)
+    assert len(r_list) == 1
+
+    api.api.dispatch('POST', '/v1/firewall/group_create', {}, {'description': 'web'})
+
+    vultr = make_vultr(api_endpoint=api.url)
+    vultr.broker = broker
+    firewall_group = vultr.query_resource_by_key('description', 'web', resource='firewall', query_by='group_list', use_cache=True)
+    assert firewall_group['description'] == 'web'
+    assert api.stats['requests']['/v1/firewall/group_list'] == 2
+
+
+def test_empty_list_is_not_cached(tmp_path, api, make_vultr):
+    broker = VultrBroker(str(tmp_path / 'broker.sock'))
+    vultr = make_vultr(api_endpoint=api.url)
+    vultr.broker = broker
+    assert vultr.query_resource_list('firewall', 'group_list', use_cache=True) == ({}, False)
+
+    api.api.dispatch('POST', '/v1/firewall/group_create', {}, {'description': 'web'})
+
+    vultr = make_vultr(api_endpoint=api.url)
+    vultr.broker = broker
+    assert vultr.query_resource_by_key('description', 'web', resource='firewall', query_by='group_list', use_cache=True)
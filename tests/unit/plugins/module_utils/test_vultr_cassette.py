@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import VultrAPIError, VultrCassette
+
+
+USER_DATA = 'email=jo%40example.com&name=jo&password=s3cr3t&acls%5B%5D=manage_users'
+USER = {'USERID': '564a1a88947b4', 'api_key': 'AAAAAAAA'}
+SERVERS = {
+    '576965': {
+        'SUBID': '576965',
+        'label': 'web-01',
+        'default_password': 'nreqnusibni',
+        'kvm_url': 'https://my.vultr.com/subs/vps/novnc/api.php?data=token',
+        'v6_networks': [],
+    },
+}
+OK = {'status': 200, 'msg': 'OK'}
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    cassette = VultrCassette(str(tmp_path / 'cassette.jsonl'), mode='record')
+    cassette.record('POST', '/v1/user/create', USER_DATA, json.dumps(USER).encode(), OK, 0.1)
+    cassette.record('GET', '/v1/server/list', None, json.dumps(SERVERS).encode(), OK, 0.1)
+    cassette.record('GET', '/v1/account/info', None, b'{"balance": "-5519.11"}', OK, 0.1)
+    return cassette.path
+
+
+def test_secrets_are_not_recorded(cassette_path):
+    with open(cassette_path) as f:
+        recorded = f.read()
+    for secret in ('s3cr3t', 'AAAAAAAA', 'nreqnusibni', 'token'):
+        assert secret not in recorded
+    assert 'jo%40example.com' in recorded
+    assert 'web-01' in recorded
+
+
+def test_bodies_without_secrets_are_recorded_as_returned(cassette_path):
+    with open(cassette_path) as f:
+        interactions = [json.loads(line) for line in f]
+    assert interactions[2]['response']['body'] == '{"balance": "-5519.11"}'
+
+
+def test_replay_matches_the_redacted_data(cassette_path):
+    cassette = VultrCassette(cassette_path)
+    body, info = cassette.replay('POST', '/v1/user/create', USER_DATA)
+    assert json.loads(body.decode()) == {'USERID': '564a1a88947b4', 'api_key': 'REDACTED'}
+
+    body, info = cassette.replay('GET', '/v1/server/list', None)
+    server = json.loads(body.decode())['576965']
+    assert (server['label'], server['default_password'], server['kvm_url']) == ('web-01', 'REDACTED', 'REDACTED')
+
+
+def test_replay_still_matches_other_data(cassette_path):
+    with pytest.raises(VultrAPIError, match='No interaction left'):
+        VultrCassette(cassette_path).replay('POST', '/v1/user/create', USER_DATA.replace('name=jo', 'name=joe'))
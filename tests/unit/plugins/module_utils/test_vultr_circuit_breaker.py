@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils import vultr
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import (
+    VultrCircuitBreaker,
+    get_state_file,
+)
+
+
+OK = {'status': 200}
+SERVER_ERROR = {'status': 500}
+CONNECTION_ERROR = {'status': -1}
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    clock = Clock()
+    monkeypatch.setattr(vultr.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return VultrCircuitBreaker(threshold=3, cooldown=30, state_file=get_state_file('circuit', 'https://api.vultr.com'))
+
+
+def test_opens_after_consecutive_failures(breaker):
+    assert breaker.record(SERVER_ERROR) == ('closed', None)
+    assert breaker.record(CONNECTION_ERROR) == ('closed', None)
+    assert breaker.record(SERVER_ERROR) == ('open', ('closed', 'open'))
+    assert breaker.allow() == (False, 'open', None)
+
+
+def test_success_resets_the_count(breaker):
+    breaker.record(SERVER_ERROR)
+    breaker.record(SERVER_ERROR)
+    breaker.record(OK)
+    breaker.record(SERVER_ERROR)
+    breaker.record(SERVER_ERROR)
+    assert breaker.allow() == (True, 'closed', None)
+
+
+@pytest.mark.parametrize('info', [
+    {'status': 503},
+    {'status': 429},
+    {'status': 500, 'retry-after': '2'},
+])
+def test_rate_limiting_is_not_a_failure(breaker, info):
+    for i in range(10):
+        breaker.record(info)
+    assert breaker.allow() == (True, 'closed', None)
+
+    # Neither does it reset the count of failures
+    breaker.record(SERVER_ERROR)
+    breaker.record(SERVER_ERROR)
+    breaker.record(info)
+    assert breaker.record(SERVER_ERROR) == ('open', ('closed', 'open'))
+
+
+def test_client_errors_are_not_failures(breaker):
+    for i in range(5):
+        breaker.record({'status': 404})
+    assert breaker.allow() == (True, 'closed', None)
+
+
+def test_half_open_probe_closes(breaker, clock):
+    for i in range(3):
+        breaker.record(SERVER_ERROR)
+
+    clock.now += 30
+    assert breaker.allow() == (True, 'half_open', ('open', 'half_open'))
+    # A single probe only until it reports back
+    assert breaker.allow() == (False, 'half_open', None)
+    assert breaker.record(OK) == ('closed', ('half_open', 'closed'))
+    assert breaker.allow() == (True, 'closed', None)
+
+
+def test_half_open_probe_failure_opens_again(breaker, clock):
+    for i in range(3):
+        breaker.record(SERVER_ERROR)
+
+    clock.now += 30
+    breaker.allow()
+    assert breaker.record(SERVER_ERROR) == ('open', ('half_open', 'open'))
+    clock.now += 29
+    assert breaker.allow() == (False, 'open', None)
+
+
+def test_state_is_shared_by_path(breaker, clock):
+    other = VultrCircuitBreaker(threshold=3, cooldown=30, state_file=breaker.state_file)
+    breaker.record(SERVER_ERROR)
+    other.record(SERVER_ERROR)
+    breaker.record(SERVER_ERROR)
+    assert other.allow() == (False, 'open', None)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+
+import pytest
+
+
+RECORDS = '/v1/dns/records?domain=example.com'
+
+
+@pytest.fixture
+def api(vultr_env, make_api):
+    api = make_api(servers=1, validators=True)
+    api.api.dispatch('POST', '/v1/dns/create_domain', {}, {'domain': 'example.com', 'serverip': '10.0.0.1'})
+    return api
+
+
+def list_cache(vultr_env):
+    cache_dir = str(vultr_env / 'cache')
+    return sorted(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else []
+
+
+def test_list_not_modified_is_served_from_the_cache(api, make_vultr):
+    first = make_vultr(api_endpoint=api.url).api_query(RECORDS)
+    assert [record['type'] for record in first] == ['A', 'CNAME']
+
+    vultr = make_vultr(api_endpoint=api.url, api_metrics=True)
+    assert vultr.api_query(RECORDS) == first
+    assert vultr.api_metrics['not_modified'] == 1
+    assert api.stats['not_modified'] == 1
+
+
+def test_streamed_list_not_modified_is_served_from_the_cache(api, make_vultr):
+    first = list(make_vultr(api_endpoint=api.url).api_query_iter(RECORDS))
+    assert len(first) == 2
+
+    assert list(make_vultr(api_endpoint=api.url).api_query_iter(RECORDS)) == first
+    assert api.stats['not_modified'] == 1
+
+
+def test_partly_read_list_is_not_kept(api, vultr_env, make_vultr):
+    records = make_vultr(api_endpoint=api.url).api_query_iter(RECORDS)
+    next(records)
+    records.close()
+    assert list_cache(vultr_env) == []
+
+    make_vultr(api_endpoint=api.url).api_query(RECORDS)
+    assert api.stats['not_modified'] == 0
+
+
+def test_change_of_the_resource_drops_the_kept_list(api, make_vultr):
+    make_vultr(api_endpoint=api.url).api_query(RECORDS)
+
+    vultr = make_vultr(api_endpoint=api.url)
+    vultr.api_query('/v1/dns/create_record', method='POST', data={'domain': 'example.com', 'type': 'A', 'name': 'db', 'data': '10.0.0.2'})
+    assert [record['name'] for record in vultr.api_query(RECORDS)] == ['', 'www', 'db']
+    assert api.stats['not_modified'] == 0
+
+
+def test_refresh_mode_does_not_revalidate(api, make_vultr):
+    make_vultr(api_endpoint=api.url).api_query(RECORDS)
+    make_vultr(api_endpoint=api.url, api_cache_mode='refresh').api_query(RECORDS)
+    assert api.stats['not_modified'] == 0
+
+    make_vultr(api_endpoint=api.url).api_query(RECORDS)
+    assert api.stats['not_modified'] == 1
+
+
+def test_lists_with_secret_fields_are_not_kept(api, vultr_env, make_vultr):
+    for i in range(2):
+        servers = make_vultr(api_endpoint=api.url).api_query('/v1/server/list')
+        server = list(servers.values())[0]
+        assert server['default_password']
+        assert server['kvm_url']
+    assert api.stats['not_modified'] == 0
+    assert list_cache(vultr_env) == []
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import gzip
+import io
+import json
+import threading
+
+import pytest
+
+from ansible.module_utils.six.moves import BaseHTTPServer
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import VultrConnectionPool
+
+
+BODY = json.dumps([{'id': i, 'label': 'server %s' % i} for i in range(200)]).encode()
+
+
+def gzip_compress(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append('GET %s' % self.path)
+        if self.path == '/drop':
+            # Keep-alive announced, but dropped once answered
+            self.close_connection = True
+        if self.path == '/missing':
+            body = b'Not found'
+            self.send_response(404)
+        else:
+            body = BODY
+            self.send_response(200)
+            if 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+                body = gzip_compress(body)
+                self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.server.requests.append('POST %s' % self.path)
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        # Connection lost in the middle of the body
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY[:100])
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api(http_server):
+    return http_server(Handler)
+
+
+@pytest.fixture
+def api_url(api):
+    return api.url
+
+
+@pytest.fixture
+def pool():
+    pool = VultrConnectionPool()
+    yield pool
+    pool.close()
+
+
+def test_connection_is_reused(pool, api_url):
+    for i in range(3):
+        body, info = pool.request(api_url + '/v1/server/list')
+        assert info['status'] == 200
+        assert body == BODY
+    assert pool.stats['requests'] == 3
+    assert pool.stats['connections_opened'] == 1
+    assert pool.stats['connections_reused'] == 2
+
+
+def test_gzip_body_is_decoded(pool, api_url):
+    body, info = pool.request(api_url + '/v1/server/list')
+    assert body == BODY
+    assert info['content-encoding'] == 'gzip'
+    assert pool.stats['bytes_received'] < pool.stats['bytes_decoded'] == len(BODY)
+
+
+def test_streamed_body_releases_the_connection_once_read(pool, api_url):
+    response, info = pool.request(api_url + '/v1/server/list', stream=True)
+    chunks = []
+    while True:
+        chunk = response.read(100)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    assert b''.join(chunks) == BODY
+
+    pool.request(api_url + '/v1/server/list')
+    assert pool.stats['connections_opened'] == 1
+
+
+def test_dropped_idle_connection_is_replaced(pool, api):
+    pool.request(api.url + '/drop')
+    body, info = pool.request(api.url + '/v1/server/list')
+    assert info['status'] == 200
+    assert body == BODY
+    assert pool.stats['connections_opened'] == 2
+    assert api.requests == ['GET /drop', 'GET /v1/server/list']
+
+
+def test_request_is_not_sent_again_once_answered(pool, api):
+    pool.request(api.url + '/v1/server/list')
+    body, info = pool.request(api.url + '/v1/server/create', method='POST', data='label=web')
+    assert body is None
+    assert info['status'] == -1
+    assert info['retryable'] is False
+    assert api.requests == ['GET /v1/server/list', 'POST /v1/server/create']
+
+
+def test_module_request_is_not_retried_once_answered(api, make_vultr):
+    vultr = make_vultr(api_endpoint=api.url)
+    with pytest.raises(SystemExit):
+        vultr.api_query('/v1/server/create', method='POST', data={'label': 'web'})
+    assert api.requests == ['POST /v1/server/create']
+
+
+def test_error_status_returns_the_body(pool, api_url):
+    body, info = pool.request(api_url + '/missing')
+    assert info['status'] == 404
+    assert info['body'] == b'Not found'
+
+
+def test_connection_error(pool):
+    body, info = pool.request('http://127.0.0.1:1/v1/server/list', timeout=5)
+    assert body is None
+    assert info['status'] == -1
+
+
+def test_stats_are_exact_across_threads(pool, api_url):
+    def run():
+        for i in range(10):
+            pool.request(api_url + '/v1/server/list')
+
+    threads = [threading.Thread(target=run) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pool.stats['requests'] == 80
+    assert pool.stats['connections_opened'] + pool.stats['connections_reused'] == 80
+    assert pool.stats['bytes_decoded'] == 80 * len(BODY)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import stat
+import time
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import VultrDiskCache
+from ansible_collections.ngine_io.vultr.tests.utils.vultr_api_server import REGIONS
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
+
+
+@pytest.fixture
+def disk_cache(cache_dir):
+    return VultrDiskCache(cache_dir, 'namespace')
+
+
+def age(disk_cache, key, seconds):
+    path = disk_cache._get_path(key)
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_set_and_get(disk_cache, cache_dir):
+    assert disk_cache.get('regions-list', 3600) is None
+    disk_cache.set('regions-list', REGIONS)
+    assert disk_cache.get('regions-list', 3600) == REGIONS
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+
+def test_entry_expires_by_age(disk_cache):
+    disk_cache.set('regions-list', REGIONS)
+    age(disk_cache, 'regions-list', 3599)
+    assert disk_cache.get('regions-list', 3600) == REGIONS
+    age(disk_cache, 'regions-list', 3601)
+    assert disk_cache.get('regions-list', 3600) is None
+
+
+def test_namespaces_are_separate(disk_cache, cache_dir):
+    disk_cache.set('regions-list', REGIONS)
+    assert VultrDiskCache(cache_dir, 'other').get('regions-list', 3600) is None
+
+
+def test_corrupt_entry_is_a_miss(disk_cache):
+    disk_cache.set('regions-list', REGIONS)
+    with open(disk_cache._get_path('regions-list'), 'w') as f:
+        f.write('{"1": {"DCID"')
+    assert disk_cache.get('regions-list', 3600) is None
+
+
+def test_invalidate_by_prefix(disk_cache):
+    disk_cache.set('firewall-group_list', {})
+    disk_cache.set('regions-list', REGIONS)
+    disk_cache.invalidate('firewall')
+    assert disk_cache.get('firewall-group_list', 3600) is None
+    assert disk_cache.get('regions-list', 3600) == REGIONS
+
+
+def test_unwritable_cache_dir_is_ignored(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text(u'')
+    disk_cache = VultrDiskCache(str(blocker / 'cache'), 'namespace')
+    disk_cache.set('regions-list', REGIONS)
+    assert disk_cache.get('regions-list', 3600) is None
+
+
+def regions_requests(api):
+    return api.stats['requests'].get('/v1/regions/list', 0)
+
+
+def test_catalog_list_is_shared_by_module_runs(api, make_vultr):
+    r_list, from_disk_cache = make_vultr(api_endpoint=api.url).query_resource_list('regions', use_cache=True)
+    assert (r_list, from_disk_cache) == (REGIONS, False)
+
+    r_list, from_disk_cache = make_vultr(api_endpoint=api.url).query_resource_list('regions', use_cache=True)
+    assert (r_list, from_disk_cache) == (REGIONS, True)
+    assert regions_requests(api) == 1
+
+
+def test_refresh_mode_fetches_and_stores(api, make_vultr):
+    make_vultr(api_endpoint=api.url).query_resource_list('regions', use_cache=True)
+    r_list, from_disk_cache = make_vultr(api_endpoint=api.url, api_cache_mode='refresh').query_resource_list('regions', use_cache=True)
+    assert (r_list, from_disk_cache) == (REGIONS, False)
+
+    r_list, from_disk_cache = make_vultr(api_endpoint=api.url).query_resource_list('regions', use_cache=True)
+    assert from_disk_cache
+    assert regions_requests(api) == 2
+
+
+def test_disabled_mode_bypasses_the_cache(api, vultr_env, make_vultr):
+    for i in range(2):
+        r_list, from_disk_cache = make_vultr(api_endpoint=api.url, api_cache_mode='disabled').query_resource_list('regions', use_cache=True)
+        assert (r_list, from_disk_cache) == (REGIONS, False)
+    assert regions_requests(api) == 2
+    assert not (vultr_env / 'cache').exists()
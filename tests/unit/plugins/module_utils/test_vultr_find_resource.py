@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from collections import OrderedDict
+
+import pytest
+
+
+FIREWALL_GROUPS = [
+    {'FIREWALLGROUPID': '1234abcd', 'description': 'web'},
+    {'FIREWALLGROUPID': 'web', 'description': 'db'},
+    {'FIREWALLGROUPID': '5678abcd', 'description': 'web'},
+    {'FIREWALLGROUPID': 42, 'description': 7},
+    {'FIREWALLGROUPID': b'9abc', 'description': b'cache'},
+]
+
+
+def as_dict(r_list):
+    return OrderedDict((str(position), r_data) for position, r_data in enumerate(r_list))
+
+
+@pytest.fixture
+def vultr(make_vultr):
+    return make_vultr()
+
+
+def find(vultr, r_list, value, id_key='FIREWALLGROUPID'):
+    vultr._cache_resource_list('firewall', r_list)
+    return vultr.find_cached_resource('firewall', 'description', value, id_key)
+
+
+@pytest.mark.parametrize('container', [list, as_dict])
+@pytest.mark.parametrize('value, id_key', [
+    # The key matches at the first and third position
+    ('web', None),
+    # The key matches at the first position, the ID key at the second position
+    ('web', 'FIREWALLGROUPID'),
+    # Either the key or the ID key matches at a single position
+    ('1234abcd', 'FIREWALLGROUPID'),
+    ('db', 'FIREWALLGROUPID'),
+    ('5678abcd', 'FIREWALLGROUPID'),
+    # Values other than text are compared as text
+    ('42', 'FIREWALLGROUPID'),
+    (42, 'FIREWALLGROUPID'),
+    (7, None),
+    ('9abc', 'FIREWALLGROUPID'),
+    ('cache', 'FIREWALLGROUPID'),
+    ('unknown', 'FIREWALLGROUPID'),
+])
+def test_cached_resource_is_the_resource_found(vultr, container, value, id_key):
+    r_list = container(FIREWALL_GROUPS)
+    expected = vultr.find_resource(r_list, 'description', value, id_key)
+    assert find(vultr, r_list, value, id_key) is expected
+
+
+def test_first_match_of_key_or_id_key_in_list_order(vultr):
+    assert find(vultr, FIREWALL_GROUPS, 'web') is FIREWALL_GROUPS[0]
+    # The ID key matches first
+    assert find(vultr, FIREWALL_GROUPS[1:], 'web') is FIREWALL_GROUPS[1]
+
+
+def test_index_is_rebuilt_for_a_new_list(vultr):
+    assert find(vultr, FIREWALL_GROUPS, 'db') is FIREWALL_GROUPS[1]
+    assert find(vultr, FIREWALL_GROUPS[:1], 'db') is None
+
+
+def test_empty_list_finds_nothing(vultr):
+    assert find(vultr, [], 'web') is None
+    assert find(vultr, {}, 'web') is None
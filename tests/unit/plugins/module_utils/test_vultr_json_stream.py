@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import io
+import json
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import VultrJSONStream
+
+
+DOCUMENTS = [
+    u'{"0": 3.14159}',
+    u'[-15000000000.0]',
+    u'[1, 22, 333, 4444e-2, 5.5E+10, -0, 0.125]',
+    u'[1e5,2E-3 , 7 ]',
+    u'{"1": {"SUBID": "1", "cost": 5.00, "tags": ["a", "b"]}, "2": {"SUBID": "2", "cost": 10.25}}',
+    u'[true, false, null, "3.", {"nested": [1.5, {"x": -2}]}]',
+    u'{"label": "Café ☃", "count": 12}',
+    u'  [ ]  ',
+    u'{}',
+]
+
+
+def decode(document, chunk_size):
+    stream = VultrJSONStream(io.BytesIO(document.encode('utf-8')))
+    stream.CHUNK_SIZE = chunk_size
+    return list(stream)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 4, 7, 8, 65536])
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_items_match_json_loads(document, chunk_size):
+    expected = json.loads(document)
+    if isinstance(expected, dict):
+        expected = list(expected.values())
+    assert decode(document, chunk_size) == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 65536])
+@pytest.mark.parametrize('document', [u'', u'   ', u'"text"', u'42'])
+def test_no_collection_yields_nothing(document, chunk_size):
+    assert decode(document, chunk_size) == []
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 65536])
+@pytest.mark.parametrize('document', [u'[1, 2', u'{"a": 1.', u'[1 2]', u'{"a" 1}', u'[3.]'])
+def test_malformed_raises(document, chunk_size):
+    with pytest.raises(ValueError):
+        decode(document, chunk_size)
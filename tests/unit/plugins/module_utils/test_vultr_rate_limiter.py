@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import stat
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils import vultr
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import (
+    VultrRateLimiter,
+    get_state_dir,
+    get_state_file,
+)
+
+
+@pytest.fixture
+def runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(vultr.time, 'sleep', delays.append)
+    return delays
+
+
+def test_state_dir_is_private(runtime_dir):
+    state_dir = get_state_dir()
+    assert os.path.dirname(state_dir) == str(runtime_dir)
+    assert stat.S_IMODE(os.lstat(state_dir).st_mode) == 0o700
+    assert os.path.dirname(get_state_file('ratelimit', 'default')) == state_dir
+
+
+def test_state_dir_accessible_by_others_is_refused(runtime_dir):
+    state_dir = get_state_dir()
+    os.chmod(state_dir, 0o755)
+    with pytest.raises(OSError):
+        get_state_dir()
+
+
+def test_state_dir_symlink_is_refused(runtime_dir, tmp_path_factory):
+    target = tmp_path_factory.mktemp('target')
+    os.chmod(str(target), 0o700)
+    os.symlink(str(target), os.path.join(str(runtime_dir), 'ansible-vultr-%s' % os.getuid()))
+    with pytest.raises(OSError):
+        get_state_dir()
+
+
+def test_state_file_symlink_is_not_followed(runtime_dir, sleeps):
+    victim = runtime_dir / 'victim'
+    victim.write_text(u'precious')
+    state_file = get_state_file('ratelimit', 'default')
+    os.symlink(str(victim), state_file)
+
+    # The rate limiter lets the request through without state rather than writing through the link
+    assert VultrRateLimiter(rate=1, state_file=state_file).acquire() == 0
+    assert victim.read_text() == u'precious'
+
+
+def test_burst_then_paced(runtime_dir, sleeps):
+    limiter = VultrRateLimiter(rate=10, state_file=get_state_file('ratelimit', 'default'))
+    for i in range(10):
+        assert limiter.acquire() == 0
+    assert limiter.acquire() == pytest.approx(0.1, abs=0.05)
+    assert sleeps and sleeps[-1] == pytest.approx(0.1, abs=0.05)
+
+
+def test_state_is_shared_by_path(runtime_dir, sleeps):
+    state_file = get_state_file('ratelimit', 'default')
+    first = VultrRateLimiter(rate=1, state_file=state_file)
+    second = VultrRateLimiter(rate=1, state_file=state_file)
+    assert first.acquire() == 0
+    assert second.acquire() > 0
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils import vultr
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import (
+    VULTR_API_RETRY_STATUS_CODES,
+    VultrRetryPolicy,
+)
+
+
+class Attempts:
+    """Return the given statuses one per attempt and record the calls."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = []
+        self.delays = []
+
+    def attempt(self, retry, info):
+        self.calls.append((retry, info))
+        return b'body', {'status': self.statuses.pop(0)}
+
+    def backoff(self, delay, info):
+        self.delays.append(delay)
+
+
+@pytest.fixture
+def policy():
+    return VultrRetryPolicy(retries=3, max_delay=12, status_codes=VULTR_API_RETRY_STATUS_CODES)
+
+
+def test_run_succeeds_after_retries(policy):
+    attempts = Attempts(503, -1, 200)
+    res, info, count = policy.run(attempts.attempt, attempts.backoff)
+    assert (res, info, count) == (b'body', {'status': 200}, 3)
+    assert attempts.calls == [(0, None), (1, {'status': 503}), (2, {'status': -1})]
+    assert len(attempts.delays) == 2
+
+
+def test_run_stops_at_terminal_errors(policy):
+    attempts = Attempts(503, 404)
+    res, info, count = policy.run(attempts.attempt, attempts.backoff)
+    assert (info, count) == ({'status': 404}, 2)
+    assert len(attempts.delays) == 1
+
+
+def test_run_does_not_back_off_after_the_last_attempt(policy):
+    attempts = Attempts(503, 503, 503)
+    res, info, count = policy.run(attempts.attempt, attempts.backoff)
+    assert (info, count) == ({'status': 503}, 3)
+    assert len(attempts.delays) == 2
+
+
+def test_run_gives_up_if_backoff_raises(policy):
+    attempts = Attempts(503, 200)
+
+    def backoff(delay, info):
+        raise RuntimeError("deadline")
+
+    with pytest.raises(RuntimeError):
+        policy.run(attempts.attempt, backoff)
+    assert len(attempts.calls) == 1
+
+
+@pytest.mark.parametrize('status, retryable', [
+    (-1, True),
+    (429, True),
+    (500, True),
+    (503, True),
+    (400, False),
+    (403, False),
+    (404, False),
+    (412, False),
+])
+def test_is_retryable(policy, status, retryable):
+    assert policy.is_retryable({'status': status}) is retryable
+
+
+def test_answered_request_is_not_retried(policy):
+    assert not policy.is_retryable({'status': -1, 'retryable': False})
+    assert policy.is_retryable({'status': -1, 'retryable': True})
+
+
+def test_retry_after_seconds():
+    assert VultrRetryPolicy.get_retry_after({'retry-after': '7'}) == 7
+    assert VultrRetryPolicy.get_retry_after({'retry-after': '-3'}) == 0
+    assert VultrRetryPolicy.get_retry_after({}) is None
+    assert VultrRetryPolicy.get_retry_after({'retry-after': 'soon'}) is None
+
+
+def test_retry_after_date(monkeypatch):
+    monkeypatch.setattr(vultr.time, 'time', lambda: 1445412480.0)
+    assert VultrRetryPolicy.get_retry_after({'retry-after': 'Wed, 21 Oct 2015 07:28:10 GMT'}) == 10
+    assert VultrRetryPolicy.get_retry_after({'retry-after': 'Wed, 21 Oct 2015 07:27:00 GMT'}) == 0
+
+
+def test_delay_honours_retry_after_up_to_the_max(policy):
+    for i in range(20):
+        assert 5 <= policy.get_delay({'status': 503, 'retry-after': '5'}) <= 6
+        assert policy.get_delay({'status': 503, 'retry-after': '60'}) == 12
+
+
+def test_delay_uses_decorrelated_jitter(policy):
+    for i in range(20):
+        assert 1 <= policy.get_delay({'status': 503}, previous_delay=1) <= 3
+        assert 1 <= policy.get_delay({'status': 503}, previous_delay=3) <= 9
+        assert policy.get_delay({'status': 503}, previous_delay=10) <= 12
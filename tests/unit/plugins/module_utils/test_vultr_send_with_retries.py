@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils import vultr as vultr_utils
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import VultrAPIError
+
+
+URL = 'https://api.vultr.com/v1/server/list'
+PATH = '/v1/server/list'
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(vultr_utils.time, 'time', clock.time)
+    return clock
+
+
+class Fetches:
+    """Answer the attempts with the given infos, each taking the given seconds, and record the timeouts."""
+
+    def __init__(self, clock, duration, *infos):
+        self.clock = clock
+        self.duration = duration
+        self.infos = list(infos)
+        self.timeouts = []
+
+    def __call__(self, url, method, data, stream, timeout, cache_ttl):
+        self.timeouts.append(timeout)
+        self.clock.now += self.duration
+        info = dict(msg='', body='', **self.infos.pop(0))
+        return b'{}', info
+
+
+@pytest.fixture
+def make_sender(make_vultr, clock, monkeypatch):
+    """Return a Vultr instance with the given args, its attempts answered by fetches and its backoffs recorded."""
+    def make_sender(fetches, **args):
+        vultr = make_vultr(api_timeout=30, api_retries=3, api_retry_max_delay=12, **args)
+        vultr.delays = []
+
+        def sleep(delay, metric='wait_time'):
+            vultr.delays.append(delay)
+            clock.now += delay
+
+        monkeypatch.setattr(vultr, 'fetch', fetches)
+        monkeypatch.setattr(vultr, 'sleep', sleep)
+        return vultr
+
+    return make_sender
+
+
+def test_timeout_without_deadline(clock, make_sender):
+    fetches = Fetches(clock, 40, dict(status=503), dict(status=200))
+    res, info = make_sender(fetches)._send_with_retries(URL, PATH, 'GET', None)
+    assert info['status'] == 200
+    assert fetches.timeouts == [30, 30]
+
+
+def test_timeout_is_bound_by_the_remaining_time_of_the_deadline(clock, make_sender):
+    fetches = Fetches(clock, 20, dict(status=503, **{'retry-after': '5'}), dict(status=200))
+    vultr = make_sender(fetches, api_deadline=50)
+    vultr._send_with_retries(URL, PATH, 'GET', None)
+    assert fetches.timeouts[0] == 30
+    assert fetches.timeouts[1] == pytest.approx(50 - 20 - vultr.delays[0])
+
+
+def test_deadline_cuts_off_the_backoff(clock, make_sender):
+    fetches = Fetches(clock, 2, dict(status=503, **{'retry-after': '5'}), dict(status=200))
+    vultr = make_sender(fetches, api_deadline=6)
+    with pytest.raises(VultrAPIError, match='Reached API deadline.*Returned 503'):
+        vultr._send_with_retries(URL, PATH, 'GET', None)
+    assert len(fetches.timeouts) == 1
+    assert vultr.delays == []
+
+
+def test_time_budget_bounds_the_deadline(clock, make_sender):
+    fetches = Fetches(clock, 2, dict(status=503, **{'retry-after': '5'}), dict(status=200))
+    vultr = make_sender(fetches, api_deadline=60, api_time_budget=4)
+    with pytest.raises(VultrAPIError, match='Reached API deadline'):
+        vultr._send_with_retries(URL, PATH, 'GET', None)
+    assert fetches.timeouts == [4]
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import threading
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.module_utils import vultr
+from ansible_collections.ngine_io.vultr.plugins.module_utils.vultr import VultrSingleFlight
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(vultr.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def single_flight():
+    return VultrSingleFlight(window=1)
+
+
+class Calls:
+
+    def __init__(self, result='response'):
+        self.result = result
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        return self.result
+
+
+def test_concurrent_callers_share_the_request(single_flight):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def leader_func():
+        calls.append('leader')
+        started.set()
+        release.wait()
+        return 'response'
+
+    results = []
+
+    def run(func):
+        results.append(single_flight.do(key='/v1/server/list', group='server', func=func))
+
+    leader = threading.Thread(target=run, args=(leader_func,))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=run, args=(Calls(),)) for i in range(3)]
+    for follower in followers:
+        follower.start()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert calls == ['leader']
+    assert sorted(results) == [('response', False)] + [('response', True)] * 3
+
+
+def test_result_is_shared_within_the_window(single_flight, clock):
+    func = Calls()
+    assert single_flight.do('/v1/regions/list', 'regions', func) == ('response', False)
+    clock.now += 1
+    assert single_flight.do('/v1/regions/list', 'regions', func) == ('response', True)
+    clock.now += 1.5
+    assert single_flight.do('/v1/regions/list', 'regions', func) == ('response', False)
+    assert func.count == 2
+
+
+def test_flights_past_the_window_are_pruned(single_flight, clock):
+    for i in range(5):
+        single_flight.do('/v1/server/list?SUBID=%s' % i, 'server', Calls())
+    clock.now += 2
+    single_flight.do('/v1/plans/list', 'plans', Calls())
+    assert list(single_flight._flights) == ['/v1/plans/list']
+
+
+def test_invalidated_group_is_not_shared(single_flight, clock):
+    func = Calls()
+    single_flight.do('/v1/server/list', 'server', func)
+    single_flight.do('/v1/plans/list', 'plans', Calls())
+    single_flight.invalidate('server')
+    assert single_flight.do('/v1/server/list', 'server', func) == ('response', False)
+    assert func.count == 2
+    assert '/v1/plans/list' in single_flight._flights
+
+
+def test_failed_request_is_not_shared(single_flight):
+    def fail():
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        single_flight.do('/v1/server/list', 'server', fail)
+    assert single_flight._flights == {}
+    assert single_flight.do('/v1/server/list', 'server', Calls()) == ('response', False)
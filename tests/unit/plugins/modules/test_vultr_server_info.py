@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os
+
+import pytest
+
+from ansible_collections.ngine_io.vultr.plugins.modules import vultr_server_info
+
+
+# Recorded against tests/utils/vultr_api_server.py --servers 3, secrets are redacted
+CASSETTE = os.path.join(os.path.dirname(__file__), 'fixtures', 'cassettes', 'vultr_server_info.jsonl')
+
+
+def run_module(capsys):
+    with pytest.raises(SystemExit):
+        vultr_server_info.main()
+    return json.loads(capsys.readouterr().out)
+
+
+def test_replay_cassette(set_module_args, monkeypatch, capsys):
+    monkeypatch.setenv('VULTR_API_CASSETTE', CASSETTE)
+    set_module_args({})
+    result = run_module(capsys)
+
+    assert not result.get('failed')
+    assert result['vultr_api']['api_cassette'] == {'path': CASSETTE, 'mode': 'replay', 'calls': 3}
+    assert [server['name'] for server in result['vultr_server_info']] == ['stand-in-0', 'stand-in-1', 'stand-in-2']
+    assert result['vultr_server_info'][0]['plan'] == '1024 MB RAM,25 GB SSD,1.00 TB BW'
+    assert result['vultr_server_info'][0]['default_password'] == 'REDACTED'
+
+
+def test_replay_fails_on_missing_interaction(set_module_args, vultr_env, monkeypatch, capsys):
+    # Without the plans list
+    cassette = str(vultr_env / 'cassette.jsonl')
+    with open(CASSETTE) as src, open(cassette, 'w') as dst:
+        dst.writelines(line for line in src if '"/v1/plans/list"' not in line)
+
+    monkeypatch.setenv('VULTR_API_CASSETTE', cassette)
+    set_module_args({})
+    result = run_module(capsys)
+
+    assert result['failed']
+    assert 'No interaction left in cassette' in result['msg']
+    assert '/v1/plans/list' in result['msg']
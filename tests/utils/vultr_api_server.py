@@ -0,0 +1,783 @@
+# -*- coding: utf-8 -*-
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""Stand-in for the Vultr v1 API to run the modules and the inventory plugin locally.
+
+Resources are kept in memory, servers are active and running as soon as they
+are created. Latency, rate limiting and server errors can be configured to
+measure throughput and retry behaviour without touching the real cloud:
+
+  python tests/utils/vultr_api_server.py --port 8080 --latency 0.05 \\
+      --latency /v1/server/list=0.5 --rate-limit 2 --error-rate 0.05 --servers 500
+
+  VULTR_API_ENDPOINT=http://127.0.0.1:8080 VULTR_API_KEY=test ansible-playbook ...
+
+Requests are counted by path, GET /_stats returns the counters. With
+--validators, GET responses carry an ETag and a Last-Modified header and
+conditional requests are answered by 304 while nothing changed.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+
+from email.utils import formatdate, parsedate_tz, mktime_tz
+
+from ansible.module_utils.six.moves import BaseHTTPServer, socketserver
+from ansible.module_utils.six.moves.urllib.parse import parse_qs, urlparse
+
+
+REGIONS = {
+    '1': dict(DCID='1', name='New Jersey', country='US', continent='North America', state='NJ', regioncode='EWR'),
+    '2': dict(DCID='2', name='Chicago', country='US', continent='North America', state='IL', regioncode='ORD'),
+    '6': dict(DCID='6', name='Atlanta', country='US', continent='North America', state='GA', regioncode='ATL'),
+    '7': dict(DCID='7', name='Amsterdam', country='NL', continent='Europe', state='', regioncode='AMS'),
+    '9': dict(DCID='9', name='Frankfurt', country='DE', continent='Europe', state='', regioncode='FRA'),
+    '25': dict(DCID='25', name='Tokyo', country='JP', continent='Asia', state='', regioncode='NRT'),
+}
+
+PLANS = {
+    '201': dict(VPSPLANID='201', name='1024 MB RAM,25 GB SSD,1.00 TB BW', vcpu_count='1', ram='1024', disk='25',
+                bandwidth='1.00', bandwidth_gb='1024', price_per_month='5.00'),
+    '202': dict(VPSPLANID='202', name='2048 MB RAM,55 GB SSD,2.00 TB BW', vcpu_count='1', ram='2048', disk='55',
+                bandwidth='2.00', bandwidth_gb='2048', price_per_month='10.00'),
+    '203': dict(VPSPLANID='203', name='4096 MB RAM,80 GB SSD,3.00 TB BW', vcpu_count='2', ram='4096', disk='80',
+                bandwidth='3.00', bandwidth_gb='3072', price_per_month='20.00'),
+    '205': dict(VPSPLANID='205', name='16384 MB RAM,2x110 GB SSD,20.00 TB BW', vcpu_count='4', ram='16384', disk='110',
+                bandwidth='20.00', bandwidth_gb='20480', price_per_month='80.00'),
+}
+
+PLANS_BAREMETAL = {
+    '100': dict(METALPLANID='100', name='65536 MB RAM,2x 240 GB SSD,5.00 TB BW', cpu_count=12, cpu_model='E-2186G',
+                cpu_thread_count=12, ram=65536, disk='2x 240 GB SSD', bandwidth_tb=5, price_per_month=300),
+}
+
+OSES = {
+    '127': dict(OSID=127, name='CentOS 6 x64', arch='x64', family='centos', windows=False),
+    '167': dict(OSID=167, name='CentOS 7 x64', arch='x64', family='centos', windows=False),
+    '215': dict(OSID=215, name='Ubuntu 16.04 x64', arch='x64', family='ubuntu', windows=False),
+    '270': dict(OSID=270, name='Ubuntu 18.04 x64', arch='x64', family='ubuntu', windows=False),
+    '159': dict(OSID=159, name='Custom', arch='x64', family='iso', windows=False),
+    '164': dict(OSID=164, name='Snapshot', arch='x64', family='snapshot', windows=False),
+    '186': dict(OSID=186, name='Application', arch='x64', family='application', windows=False),
+}
+
+APPS = {
+    '1': dict(APPID='1', name='LEMP', short_name='lemp', deploy_name='LEMP on CentOS 6 x64', surcharge=0),
+    '2': dict(APPID='2', name='WordPress', short_name='wordpress', deploy_name='WordPress on CentOS 6 x64', surcharge=0),
+}
+
+
+class APIError(Exception):
+
+    def __init__(self, msg, status=412):
+        super(APIError, self).__init__(msg)
+        self.status = status
+
+
+class VultrAPIState:
+    """In-memory resources of an account, changed by the API calls."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = 0
+        # Time of the last change, the Last-Modified of all responses
+        self.modified = int(time.time())
+        self.account = dict(balance='-100.00', pending_charges='1.50', last_payment_date='2020-07-01 12:00:00', last_payment_amount='-10.00')
+        self.servers = dict()
+        self.baremetals = dict()
+        self.user_data = dict()
+        self.volumes = dict()
+        self.domains = dict()
+        self.firewall_groups = dict()
+        self.firewall_rules = dict()
+        self.networks = dict()
+        self.ssh_keys = dict()
+        self.scripts = dict()
+        self.snapshots = dict()
+        self.users = dict()
+
+    def new_id(self, prefix=''):
+        self.ids += 1
+        return '%s%d' % (prefix, 1000000 + self.ids)
+
+    @staticmethod
+    def now():
+        return time.strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def get(resources, resource_id, name):
+        if resource_id not in resources:
+            raise APIError("Invalid %s. Check %s value and ensure your API key matches the account" % (name, resource_id))
+        return resources[resource_id]
+
+    @staticmethod
+    def require(form, *keys):
+        for key in keys:
+            if not form.get(key):
+                raise APIError("Missing parameter %s" % key)
+
+    def add_server(self, form):
+        self.require(form, 'DCID', 'VPSPLANID')
+        region = self.get(REGIONS, form['DCID'], 'DCID')
+        plan = self.get(PLANS, form['VPSPLANID'], 'VPSPLANID')
+        if form.get('SNAPSHOTID'):
+            self.get(self.snapshots, form['SNAPSHOTID'], 'SNAPSHOTID')
+            os = OSES['164']
+        else:
+            self.require(form, 'OSID')
+            os = self.get(OSES, form['OSID'], 'OSID')
+        firewall_group_id = form.get('FIREWALLGROUPID') or '0'
+        if firewall_group_id != '0':
+            self.get(self.firewall_groups, firewall_group_id, 'FIREWALLGROUPID')
+
+        sub_id = self.new_id()
+        number = int(sub_id) % 65536
+        main_ip = '192.0.%d.%d' % (number // 256, number % 256)
+        server = dict(
+            SUBID=sub_id,
+            label=form.get('label', ''),
+            os=os['name'],
+            OSID=str(os['OSID']),
+            APPID=form.get('APPID') or '0',
+            ram='%s MB' % plan['ram'],
+            disk='Virtual %s GB' % plan['disk'],
+            vcpu_count=plan['vcpu_count'],
+            VPSPLANID=plan['VPSPLANID'],
+            location=region['name'],
+            DCID=region['DCID'],
+            main_ip=main_ip,
+            netmask_v4='255.255.254.0',
+            gateway_v4='192.0.0.1',
+            internal_ip='',
+            v6_main_ip='',
+            v6_network='',
+            v6_network_size='',
+            v6_networks=[],
+            default_password='stand-in-%s' % sub_id,
+            date_created=self.now(),
+            pending_charges='0.00',
+            cost_per_month=plan['price_per_month'],
+            current_bandwidth_gb=0,
+            allowed_bandwidth_gb=plan['bandwidth_gb'],
+            status='active',
+            power_status='running',
+            server_state='ok',
+            kvm_url='https://my.vultr.com/subs/vps/novnc/api.php?data=%s' % sub_id,
+            auto_backups='yes' if form.get('auto_backups') == 'yes' else 'no',
+            tag=form.get('tag', ''),
+            FIREWALLGROUPID=firewall_group_id,
+        )
+        if form.get('enable_ipv6') == 'yes':
+            self.enable_ipv6(server)
+        if form.get('enable_private_network') == 'yes':
+            server['internal_ip'] = '10.99.%d.%d' % (number // 256, number % 256)
+        self.servers[sub_id] = server
+        self.user_data[sub_id] = form.get('userdata') or ''
+        return sub_id
+
+    @staticmethod
+    def enable_ipv6(server):
+        server.update(
+            v6_main_ip='2001:db8:%x::1' % (int(server['SUBID']) % 65536),
+            v6_network='2001:db8:%x::' % (int(server['SUBID']) % 65536),
+            v6_network_size='64',
+        )
+        server['v6_networks'] = [dict(v6_network=server['v6_network'], v6_main_ip=server['v6_main_ip'], v6_network_size='64')]
+
+    def add_baremetal(self, form):
+        self.require(form, 'DCID', 'METALPLANID', 'OSID')
+        region = self.get(REGIONS, form['DCID'], 'DCID')
+        plan = self.get(PLANS_BAREMETAL, form['METALPLANID'], 'METALPLANID')
+        os = self.get(OSES, form['OSID'], 'OSID')
+        sub_id = self.new_id()
+        number = int(sub_id) % 65536
+        self.baremetals[sub_id] = dict(
+            SUBID=sub_id,
+            label=form.get('label', ''),
+            os=os['name'],
+            OSID=str(os['OSID']),
+            APPID='0',
+            ram='%s MB' % plan['ram'],
+            disk=plan['disk'],
+            cpu_count=plan['cpu_count'],
+            METALPLANID=plan['METALPLANID'],
+            location=region['name'],
+            DCID=region['DCID'],
+            main_ip='198.51.%d.%d' % (number // 256, number % 256),
+            netmask_v4='255.255.255.0',
+            gateway_v4='198.51.0.1',
+            v6_networks=[],
+            default_password='stand-in-%s' % sub_id,
+            date_created=self.now(),
+            status='active',
+            tag=form.get('tag', ''),
+        )
+        self.user_data[sub_id] = form.get('user_data') or ''
+        return sub_id
+
+
+class VultrAPIStandIn:
+    """Dispatch the v1 API calls to handlers changing the state."""
+
+    def __init__(self, state):
+        self.state = state
+        self.routes = {
+            ('GET', '/v1/account/info'): lambda q, f: self.state.account,
+            ('GET', '/v1/regions/list'): lambda q, f: REGIONS,
+            ('GET', '/v1/plans/list'): lambda q, f: PLANS,
+            ('GET', '/v1/plans/list_baremetal'): lambda q, f: PLANS_BAREMETAL,
+            ('GET', '/v1/os/list'): lambda q, f: OSES,
+            ('GET', '/v1/app/list'): lambda q, f: APPS,
+            ('GET', '/v1/snapshot/list'): lambda q, f: self.state.snapshots,
+            ('GET', '/v1/server/list'): self.server_list,
+            ('POST', '/v1/server/create'): lambda q, f: dict(SUBID=self.state.add_server(f)),
+            ('GET', '/v1/server/get_user_data'): self.get_user_data(self.state.servers),
+            ('POST', '/v1/server/set_user_data'): self.set_user_data(self.state.servers),
+            ('POST', '/v1/server/tag_set'): self.server_update(self.state.servers, lambda s, f: s.update(tag=f.get('tag', ''))),
+            ('POST', '/v1/server/destroy'): self.delete(self.state.servers, 'SUBID'),
+            ('POST', '/v1/server/start'): self.server_update(self.state.servers, lambda s, f: s.update(power_status='running')),
+            ('POST', '/v1/server/halt'): self.server_update(self.state.servers, lambda s, f: s.update(power_status='stopped')),
+            ('POST', '/v1/server/reboot'): self.server_update(self.state.servers, lambda s, f: s.update(power_status='running')),
+            ('POST', '/v1/server/reinstall'): self.server_update(self.state.servers, lambda s, f: s.update(power_status='running')),
+            ('POST', '/v1/server/backup_enable'): self.server_update(self.state.servers, lambda s, f: s.update(auto_backups='yes')),
+            ('POST', '/v1/server/backup_disable'): self.server_update(self.state.servers, lambda s, f: s.update(auto_backups='no')),
+            ('POST', '/v1/server/ipv6_enable'): self.server_update(self.state.servers, lambda s, f: self.state.enable_ipv6(s)),
+            ('POST', '/v1/server/private_network_enable'): self.server_update(
+                self.state.servers, lambda s, f: s.update(internal_ip='10.99.0.%d' % (int(s['SUBID']) % 256))),
+            ('POST', '/v1/server/upgrade_plan'): self.server_update(self.state.servers, self.upgrade_plan),
+            ('POST', '/v1/server/firewall_group_set'): self.server_update(self.state.servers, self.firewall_group_set),
+            ('GET', '/v1/baremetal/list'): lambda q, f: self.filter_servers(self.state.baremetals, q),
+            ('POST', '/v1/baremetal/create'): lambda q, f: dict(SUBID=self.state.add_baremetal(f)),
+            ('GET', '/v1/baremetal/get_user_data'): self.get_user_data(self.state.baremetals),
+            ('POST', '/v1/baremetal/set_user_data'): self.set_user_data(self.state.baremetals),
+            ('POST', '/v1/baremetal/tag_set'): self.server_update(self.state.baremetals, lambda s, f: s.update(tag=f.get('tag', ''))),
+            ('POST', '/v1/baremetal/destroy'): self.delete(self.state.baremetals, 'SUBID'),
+            ('GET', '/v1/block/list'): lambda q, f: list(self.state.volumes.values()),
+            ('POST', '/v1/block/create'): self.block_create,
+            ('POST', '/v1/block/delete'): self.delete(self.state.volumes, 'SUBID'),
+            ('POST', '/v1/block/attach'): self.block_attach,
+            ('POST', '/v1/block/detach'): self.server_update(self.state.volumes, lambda v, f: v.update(attached_to_SUBID=None)),
+            ('POST', '/v1/block/resize'): self.server_update(self.state.volumes, lambda v, f: v.update(size_gb=int(f.get('size_gb') or 0))),
+            ('GET', '/v1/dns/list'): lambda q, f: [dict(domain=d['domain'], date_created=d['date_created']) for d in self.state.domains.values()],
+            ('POST', '/v1/dns/create_domain'): self.dns_create_domain,
+            ('POST', '/v1/dns/delete_domain'): self.delete(self.state.domains, 'domain'),
+            ('GET', '/v1/dns/records'): lambda q, f: self.get_domain(q)['records'],
+            ('POST', '/v1/dns/create_record'): self.dns_create_record,
+            ('POST', '/v1/dns/update_record'): self.dns_update_record,
+            ('POST', '/v1/dns/delete_record'): self.dns_delete_record,
+            ('GET', '/v1/firewall/group_list'): lambda q, f: self.state.firewall_groups,
+            ('POST', '/v1/firewall/group_create'): self.firewall_group_create,
+            ('POST', '/v1/firewall/group_delete'): self.delete(self.state.firewall_groups, 'FIREWALLGROUPID'),
+            ('GET', '/v1/firewall/rule_list'): self.firewall_rule_list,
+            ('POST', '/v1/firewall/rule_create'): self.firewall_rule_create,
+            ('POST', '/v1/firewall/rule_delete'): self.firewall_rule_delete,
+            ('GET', '/v1/network/list'): lambda q, f: self.state.networks,
+            ('POST', '/v1/network/create'): self.network_create,
+            ('POST', '/v1/network/destroy'): self.delete(self.state.networks, 'NETWORKID'),
+            ('GET', '/v1/sshkey/list'): lambda q, f: self.state.ssh_keys,
+            ('POST', '/v1/sshkey/create'): self.create(self.state.ssh_keys, 'SSHKEYID', ('name', 'ssh_key')),
+            ('POST', '/v1/sshkey/update'): self.update(self.state.ssh_keys, 'SSHKEYID', ('name', 'ssh_key')),
+            ('POST', '/v1/sshkey/destroy'): self.delete(self.state.ssh_keys, 'SSHKEYID'),
+            ('GET', '/v1/startupscript/list'): lambda q, f: self.state.scripts,
+            ('POST', '/v1/startupscript/create'): self.create(self.state.scripts, 'SCRIPTID', ('name', 'script', 'type')),
+            ('POST', '/v1/startupscript/update'): self.update(self.state.scripts, 'SCRIPTID', ('name', 'script')),
+            ('POST', '/v1/startupscript/destroy'): self.delete(self.state.scripts, 'SCRIPTID'),
+            ('GET', '/v1/user/list'): lambda q, f: list(self.state.users.values()),
+            ('POST', '/v1/user/create'): self.user_create,
+            ('POST', '/v1/user/update'): self.update(self.state.users, 'USERID', ('name', 'email', 'api_enabled', 'acls')),
+            ('POST', '/v1/user/delete'): self.delete(self.state.users, 'USERID'),
+            ('GET', '/v2/instances'): self.v2_instances,
+            ('GET', '/v2/bare-metals'): self.v2_bare_metals,
+        }
+
+    def dispatch(self, method, path, query, form):
+        route = self.routes.get((method, path))
+        if route is None:
+            raise APIError("Invalid API location. Check the URL that you are using", status=404)
+        with self.state.lock:
+            result = route(query, form)
+            if method == 'POST':
+                self.state.modified = int(time.time())
+            return result
+
+    @staticmethod
+    def filter_servers(servers, query):
+        return dict((sub_id, server) for sub_id, server in servers.items() if (
+            (not query.get('SUBID') or query['SUBID'] == sub_id) and
+            (not query.get('tag') or query['tag'] == server['tag']) and
+            (not query.get('label') or query['label'] == server['label'])
+        ))
+
+    def server_list(self, query, form):
+        return self.filter_servers(self.state.servers, query)
+
+    def server_update(self, resources, func):
+        def handler(query, form):
+            func(self.state.get(resources, form.get('SUBID'), 'SUBID'), form)
+        return handler
+
+    def upgrade_plan(self, server, form):
+        server['VPSPLANID'] = self.state.get(PLANS, form.get('VPSPLANID'), 'VPSPLANID')['VPSPLANID']
+
+    def firewall_group_set(self, server, form):
+        firewall_group_id = form.get('FIREWALLGROUPID') or '0'
+        if firewall_group_id != '0':
+            self.state.get(self.state.firewall_groups, firewall_group_id, 'FIREWALLGROUPID')
+        server['FIREWALLGROUPID'] = firewall_group_id
+
+    def get_user_data(self, resources):
+        def handler(query, form):
+            self.state.get(resources, query.get('SUBID'), 'SUBID')
+            return dict(userdata=self.state.user_data.get(query['SUBID'], ''))
+        return handler
+
+    def set_user_data(self, resources):
+        def handler(query, form):
+            self.state.get(resources, form.get('SUBID'), 'SUBID')
+            self.state.user_data[form['SUBID']] = form.get('userdata') or ''
+        return handler
+
+    def create(self, resources, id_key, keys):
+        def handler(query, form):
+            self.state.require(form, 'name')
+            resource_id = self.state.new_id()
+            resource = dict((key, form.get(key, '')) for key in keys)
+            resource.update({
+                id_key: resource_id,
+                'date_created': self.state.now(),
+                'date_modified': self.state.now(),
+            })
+            resources[resource_id] = resource
+            return {id_key: resource_id}
+        return handler
+
+    def update(self, resources, id_key, keys):
+        def handler(query, form):
+            resource = self.state.get(resources, form.get(id_key), id_key)
+            resource.update(dict((key, form[key]) for key in keys if key in form))
+            resource['date_modified'] = self.state.now()
+        return handler
+
+    def delete(self, resources, id_key):
+        def handler(query, form):
+            self.state.get(resources, form.get(id_key), id_key)
+            del resources[form[id_key]]
+        return handler
+
+    def block_create(self, query, form):
+        self.state.require(form, 'DCID', 'size_gb')
+        self.state.get(REGIONS, form['DCID'], 'DCID')
+        sub_id = self.state.new_id()
+        self.state.volumes[sub_id] = dict(
+            SUBID=sub_id,
+            label=form.get('label', ''),
+            DCID=form['DCID'],
+            size_gb=int(form['size_gb']),
+            cost_per_month=int(form['size_gb']) / 10.0,
+            date_created=self.state.now(),
+            status='active',
+            attached_to_SUBID=None,
+        )
+        return dict(SUBID=sub_id)
+
+    def block_attach(self, query, form):
+        volume = self.state.get(self.state.volumes, form.get('SUBID'), 'SUBID')
+        self.state.get(self.state.servers, form.get('attach_to_SUBID'), 'attach_to_SUBID')
+        volume['attached_to_SUBID'] = form['attach_to_SUBID']
+
+    def get_domain(self, params):
+        return self.state.get(self.state.domains, params.get('domain'), 'domain')
+
+    def dns_create_domain(self, query, form):
+        self.state.require(form, 'domain', 'serverip')
+        domain = form['domain']
+        if domain in self.state.domains:
+            raise APIError("Domain already exists")
+        self.state.domains[domain] = dict(domain=domain, date_created=self.state.now(), records=[])
+        self.add_record(domain, dict(type='A', name='', data=form['serverip']))
+        self.add_record(domain, dict(type='CNAME', name='www', data=domain))
+
+    def add_record(self, domain, form):
+        self.get_domain(dict(domain=domain))['records'].append(dict(
+            RECORDID=int(self.state.new_id()),
+            type=form.get('type'),
+            name=form.get('name') or '',
+            data=form.get('data'),
+            priority=int(form.get('priority') or 0),
+            ttl=int(form.get('ttl') or 300),
+        ))
+
+    def dns_create_record(self, query, form):
+        self.state.require(form, 'domain', 'type', 'data')
+        self.add_record(form['domain'], form)
+
+    def find_record(self, form):
+        for record in self.get_domain(form)['records']:
+            if str(record['RECORDID']) == form.get('RECORDID'):
+                return record
+        raise APIError("Invalid RECORDID")
+
+    def dns_update_record(self, query, form):
+        record = self.find_record(form)
+        for key in ('name', 'data'):
+            if key in form:
+                record[key] = form[key]
+        for key in ('priority', 'ttl'):
+            if form.get(key):
+                record[key] = int(form[key])
+
+    def dns_delete_record(self, query, form):
+        self.get_domain(form)['records'].remove(self.find_record(form))
+
+    def firewall_group_create(self, query, form):
+        group_id = '%08x' % int(self.state.new_id())
+        self.state.firewall_groups[group_id] = dict(
+            FIREWALLGROUPID=group_id,
+            description=form.get('description', ''),
+            date_created=self.state.now(),
+            date_modified=self.state.now(),
+            instance_count=0,
+            rule_count=0,
+            max_rule_count=50,
+        )
+        self.state.firewall_rules[group_id] = dict()
+        return dict(FIREWALLGROUPID=group_id)
+
+    def firewall_rule_list(self, query, form):
+        self.state.get(self.state.firewall_groups, query.get('FIREWALLGROUPID'), 'FIREWALLGROUPID')
+        rules = self.state.firewall_rules[query['FIREWALLGROUPID']]
+        return dict((str(number), dict((k, v) for k, v in rule.items() if k != 'ip_type'))
+                    for number, rule in rules.items()
+                    if not query.get('ip_type') or rule['ip_type'] == query['ip_type'])
+
+    def firewall_rule_create(self, query, form):
+        self.state.require(form, 'FIREWALLGROUPID', 'ip_type', 'protocol')
+        group = self.state.get(self.state.firewall_groups, form['FIREWALLGROUPID'], 'FIREWALLGROUPID')
+        rules = self.state.firewall_rules[form['FIREWALLGROUPID']]
+        number = max(list(rules.keys()) + [0]) + 1
+        rules[number] = dict(
+            rulenumber=number,
+            ip_type=form['ip_type'],
+            action='accept',
+            protocol=form['protocol'],
+            port=form.get('port') or '',
+            subnet=form.get('subnet') or '',
+            subnet_size=int(form.get('subnet_size') or 0),
+            notes=form.get('notes') or '',
+        )
+        group['rule_count'] = len(rules)
+        return dict(rulenumber=number)
+
+    def firewall_rule_delete(self, query, form):
+        group = self.state.get(self.state.firewall_groups, form.get('FIREWALLGROUPID'), 'FIREWALLGROUPID')
+        rules = self.state.firewall_rules[form['FIREWALLGROUPID']]
+        self.state.get(rules, int(form.get('rulenumber') or 0), 'rulenumber')
+        del rules[int(form['rulenumber'])]
+        group['rule_count'] = len(rules)
+
+    def network_create(self, query, form):
+        self.state.require(form, 'DCID')
+        self.state.get(REGIONS, form['DCID'], 'DCID')
+        network_id = 'net%x' % int(self.state.new_id())
+        self.state.networks[network_id] = dict(
+            NETWORKID=network_id,
+            DCID=form['DCID'],
+            description=form.get('description', ''),
+            v4_subnet=form.get('v4_subnet', ''),
+            v4_subnet_mask=int(form.get('v4_subnet_mask') or 0),
+            date_created=self.state.now(),
+        )
+        return dict(NETWORKID=network_id)
+
+    def user_create(self, query, form):
+        self.state.require(form, 'email', 'name', 'password')
+        user_id = '%x' % int(self.state.new_id())
+        api_key = 'STANDIN%s' % user_id.upper()
+        self.state.users[user_id] = dict(
+            USERID=user_id,
+            name=form['name'],
+            email=form['email'],
+            api_enabled=form.get('api_enabled') or 'yes',
+            acls=form.get('acls') or [],
+        )
+        return dict(USERID=user_id, api_key=api_key)
+
+    @staticmethod
+    def v2_page(servers, query, key, to_v2):
+        servers = sorted(servers.values(), key=lambda s: int(s['SUBID']))
+        start = int(query.get('cursor') or 0)
+        per_page = int(query.get('per_page') or 100)
+        next_cursor = str(start + per_page) if start + per_page < len(servers) else ''
+        return {
+            key: [to_v2(server) for server in servers[start:start + per_page]],
+            'meta': dict(total=len(servers), links=dict(next=next_cursor, prev='')),
+        }
+
+    def v2_bare_metals(self, query, form):
+        return self.v2_page(self.filter_servers(self.state.baremetals, query), query, 'bare_metals', lambda server: dict(
+            id=server['SUBID'],
+            label=server['label'],
+            os=server['os'],
+            os_id=int(server['OSID']),
+            ram=server['ram'],
+            disk=server['disk'],
+            cpu_count=server['cpu_count'],
+            plan=server['METALPLANID'],
+            region=REGIONS[server['DCID']]['regioncode'].lower(),
+            main_ip=server['main_ip'],
+            netmask_v4=server['netmask_v4'],
+            gateway_v4=server['gateway_v4'],
+            v6_main_ip='',
+            v6_network='',
+            v6_network_size=0,
+            default_password=server['default_password'],
+            date_created=server['date_created'],
+            status=server['status'],
+            tag=server['tag'],
+            tags=[server['tag']] if server['tag'] else [],
+        ))
+
+    def v2_instances(self, query, form):
+        return self.v2_page(self.filter_servers(self.state.servers, query), query, 'instances', lambda server: dict(
+            id=server['SUBID'],
+            label=server['label'],
+            hostname=server['label'],
+            os=server['os'],
+            os_id=int(server['OSID']),
+            ram=int(server['ram'].split()[0]),
+            disk=int(server['disk'].split()[1]),
+            vcpu_count=int(server['vcpu_count']),
+            plan=server['VPSPLANID'],
+            region=REGIONS[server['DCID']]['regioncode'].lower(),
+            main_ip=server['main_ip'],
+            netmask_v4=server['netmask_v4'],
+            gateway_v4=server['gateway_v4'],
+            internal_ip=server['internal_ip'],
+            v6_main_ip=server['v6_main_ip'],
+            v6_network=server['v6_network'],
+            v6_network_size=int(server['v6_network_size'] or 0),
+            date_created=server['date_created'],
+            allowed_bandwidth=int(server['allowed_bandwidth_gb']),
+            status=server['status'],
+            power_status=server['power_status'],
+            server_status=server['server_state'],
+            kvm=server['kvm_url'],
+            tag=server['tag'],
+            tags=[server['tag']] if server['tag'] else [],
+            firewall_group_id=server['FIREWALLGROUPID'] if server['FIREWALLGROUPID'] != '0' else '',
+            features=['auto_backups'] if server['auto_backups'] == 'yes' else [],
+        ))
+
+
+class TokenBucket:
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.timestamp = time.time()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.rate, self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def parse_params(qs):
+        params = dict()
+        for key, values in parse_qs(qs, keep_blank_values=True).items():
+            if key.endswith('[]'):
+                params[key[:-2]] = values
+            else:
+                params[key] = values[0]
+        return params
+
+    def handle_request(self, method):
+        server = self.server
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+
+        if parsed.path == '/_stats':
+            with server.stats_lock:
+                return self.send_body(200, json.dumps(server.stats))
+
+        with server.stats_lock:
+            requests = server.stats['requests']
+            requests[parsed.path] = requests.get(parsed.path, 0) + 1
+
+        latency = server.latencies.get(parsed.path, server.latency)
+        if latency:
+            time.sleep(latency)
+
+        if not self.headers.get('API-Key') and not (self.headers.get('Authorization') or '').startswith('Bearer '):
+            return self.send_body(403, "Invalid API key", content_type='text/plain')
+
+        if server.rate_limiter is not None and not server.rate_limiter.take():
+            with server.stats_lock:
+                server.stats['rate_limited'] += 1
+            headers = {'Retry-After': str(server.retry_after)} if server.retry_after else None
+            return self.send_body(503, "Rate limit reached", content_type='text/plain', headers=headers)
+
+        if server.error_rate and server.random.random() < server.error_rate:
+            with server.stats_lock:
+                server.stats['injected_errors'] += 1
+            return self.send_body(server.random.choice([500, 502, 504]), "Injected server error", content_type='text/plain')
+
+        try:
+            result = server.api.dispatch(method, parsed.path, self.parse_params(parsed.query), self.parse_params(body))
+        except APIError as e:
+            return self.send_body(e.status, str(e), content_type='text/plain')
+        body = json.dumps(result) if result is not None else ''
+
+        if method == 'GET' and server.validators:
+            headers = {
+                'ETag': '"%s"' % hashlib.sha1(body.encode('utf-8')).hexdigest(),
+                'Last-Modified': formatdate(server.state.modified, usegmt=True),
+            }
+            if self.is_not_modified(headers['ETag'], server.state.modified):
+                with server.stats_lock:
+                    server.stats['not_modified'] += 1
+                return self.send_body(304, '', headers=headers)
+            return self.send_body(200, body, headers=headers)
+        self.send_body(200, body)
+
+    def is_not_modified(self, etag, modified):
+        if self.headers.get('If-None-Match'):
+            return etag in [tag.strip() for tag in self.headers['If-None-Match'].split(',')]
+        since = parsedate_tz(self.headers.get('If-Modified-Since') or '')
+        return since is not None and modified <= mktime_tz(since)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+
+class VultrAPIServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0, latencies=None, rate_limit=0, retry_after=None, error_rate=0, seed=None, validators=False,
+                 verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, RequestHandler)
+        self.state = VultrAPIState()
+        self.api = VultrAPIStandIn(self.state)
+        self.latency = latency
+        self.latencies = latencies or {}
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.validators = validators
+        self.verbose = verbose
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'requests': dict(),
+            'rate_limited': 0,
+            'injected_errors': 0,
+            'not_modified': 0,
+        }
+
+    def add_servers(self, count, tag=''):
+        with self.state.lock:
+            for i in range(count):
+                self.state.add_server(dict(
+                    label='stand-in-%d' % i,
+                    DCID=sorted(REGIONS)[i % len(REGIONS)],
+                    VPSPLANID='201',
+                    OSID='167',
+                    tag=tag,
+                ))
+
+    def add_baremetals(self, count, tag=''):
+        with self.state.lock:
+            for i in range(count):
+                self.state.add_baremetal(dict(
+                    label='stand-in-metal-%d' % i,
+                    DCID=sorted(REGIONS)[i % len(REGIONS)],
+                    METALPLANID='100',
+                    OSID='167',
+                    tag=tag,
+                ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in for the Vultr v1 API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', action='append', default=[],
+                        help="Seconds added to every request, or to the requests of a path given as PATH=SECONDS. Repeatable.")
+    parser.add_argument('--rate-limit', type=float, default=0, help="Requests per second, more are answered by 503. 0 disables.")
+    parser.add_argument('--retry-after', type=int, help="Retry-After header of rate limited responses.")
+    parser.add_argument('--error-rate', type=float, default=0, help="Fraction of requests answered by a 500, 502 or 504.")
+    parser.add_argument('--seed', type=int, help="Seed of the injected errors.")
+    parser.add_argument('--servers', type=int, default=0, help="Amount of servers to create at start.")
+    parser.add_argument('--baremetals', type=int, default=0, help="Amount of bare metal servers to create at start.")
+    parser.add_argument('--servers-tag', default='', help="Tag of the servers created at start.")
+    parser.add_argument('--validators', action='store_true', help="Send ETag and Last-Modified headers, answer conditional requests by 304.")
+    parser.add_argument('--verbose', action='store_true', help="Log the requests.")
+    args = parser.parse_args()
+
+    latency = 0
+    latencies = dict()
+    for value in args.latency:
+        if '=' in value:
+            path, seconds = value.rsplit('=', 1)
+            latencies[path] = float(seconds)
+        else:
+            latency = float(value)
+
+    server = VultrAPIServer(
+        (args.host, args.port),
+        latency=latency,
+        latencies=latencies,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        validators=args.validators,
+        verbose=args.verbose,
+    )
+    server.add_servers(args.servers, args.servers_tag)
+    server.add_baremetals(args.baremetals, args.servers_tag)
+    print("Vultr API stand-in listening on http://%s:%s" % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()